@@ -13,6 +13,49 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = "json_password"
     DB_NAME: str = "json_db"
 
+    # Mapping engine
+    JSONPATH_CACHE_SIZE: int = 1024
+
+    # Batch conversion: 1 worker converts in the request process; more
+    # share one long-lived pool of that many processes per API process
+    CONVERT_WORKERS: int = 1
+    CONVERT_CHUNK_SIZE: int = 200
+
+    # Export rendering: 1 worker renders in the request process; more
+    # share one long-lived pool of that many processes per API process
+    EXPORT_RENDER_WORKERS: int = 1
+
+    # Rendered export artifacts, keyed by content and config versions
+    EXPORT_CACHE_ENABLED: bool = True
+    EXPORT_CACHE_DIR: str = "var/export_cache"
+    EXPORT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Streaming uploads: documents inserted per chunk, and the largest
+    # single document accepted
+    INGEST_CHUNK_SIZE: int = 500
+    INGEST_MAX_DOCUMENT_BYTES: int = 64 * 1024 * 1024
+
+    # Document JSON storage: "none" (JSON columns), "zlib" or "zstd"
+    # (needs zstandard), compressed with a per-json_type dictionary
+    DOCUMENT_COMPRESSION: str = "none"
+    # Dictionary training: documents sampled and dictionary size
+    DOCUMENT_DICT_SAMPLES: int = 500
+    DOCUMENT_DICT_BYTES: int = 32 * 1024
+
+    # Relative ExportTemplate.template_path values are resolved against this
+    EXPORT_TEMPLATE_DIR: str = "templates"
+
+    # Background export jobs: worker processes started with each app
+    # process. The default 0 runs them separately with
+    # `python -m app.utils.export_jobs`.
+    EXPORT_JOB_WORKERS: int = 0
+    EXPORT_JOB_DIR: str = "var/export_jobs"
+    EXPORT_JOB_POLL_SECONDS: float = 2.0
+    # Heartbeat/progress write interval for running jobs
+    EXPORT_JOB_HEARTBEAT_SECONDS: float = 15.0
+    # RUNNING jobs without a heartbeat for this long are re-queued
+    EXPORT_JOB_STALE_SECONDS: int = 600
+
     class Config:
         env_file = ".env"
 
@@ -1,13 +1,59 @@
 # app/main.py
+import logging
+
 from fastapi import FastAPI
 from app.config import settings
+from app.db.connection import SessionLocal
+from app.utils.conversion_executor import shutdown_conversion_pool
+from app.utils.render_executor import shutdown_render_pool
+from app.utils.export_jobs import requeue_stale_jobs, start_workers, stop_workers
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
 )
 
+logger = logging.getLogger(__name__)
+
 
 @app.get("/health", tags=["system"])
 def health_check():
     return {"status": "ok"}
+
+
+# Background export job workers (see app/utils/export_jobs.py). Off by
+# default (EXPORT_JOB_WORKERS=0): workers usually run as a separate service.
+_export_workers = None
+
+
+@app.on_event("startup")
+def start_export_workers():
+    global _export_workers
+    if settings.EXPORT_JOB_WORKERS <= 0:
+        return
+    # Workers re-queue stale jobs themselves too, so an unreachable
+    # database here must not stop the API from starting.
+    db = SessionLocal()
+    try:
+        requeue_stale_jobs(db)
+    except Exception:
+        logger.exception("Could not re-queue stale export jobs at startup")
+    finally:
+        db.close()
+    _export_workers = start_workers(settings.EXPORT_JOB_WORKERS)
+
+
+@app.on_event("shutdown")
+def stop_export_workers():
+    global _export_workers
+    if _export_workers is not None:
+        stop_workers(*_export_workers)
+        _export_workers = None
+
+
+@app.on_event("shutdown")
+def stop_process_pools():
+    # Conversion and render workers are spawned on first use and kept for
+    # the life of the process.
+    shutdown_conversion_pool()
+    shutdown_render_pool()
@@ -0,0 +1,29 @@
+from sqlalchemy import (
+    Column, BigInteger, String, DateTime, ForeignKey, Integer, LargeBinary
+)
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+
+class CompressionDictionary(Base):
+    """
+    Shared compression dictionary for the documents of one json_type.
+
+    Rows are never changed or deleted: compressed documents record the id
+    of the dictionary they were written with, and a newer dictionary for
+    the json_type only applies to documents written after it.
+    """
+    __tablename__ = "compression_dictionary"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+
+    json_type_id = Column(BigInteger, ForeignKey("json_type.id"), nullable=False)
+    # "zlib" or "zstd"; a dictionary only works with the codec it was built for
+    codec = Column(String(20), nullable=False)
+    data = Column(LargeBinary(length=2**24 - 1), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    json_type = relationship("JSONType")
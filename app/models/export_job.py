@@ -0,0 +1,46 @@
+from sqlalchemy import (
+    Column, BigInteger, String, Text, DateTime, Boolean,
+    ForeignKey, Integer, Enum
+)
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+from app.models.export_template import ExportFormat
+import enum
+
+
+class ExportJobStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class ExportJob(Base):
+    __tablename__ = "export_job"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+
+    batch_id = Column(BigInteger, ForeignKey("json_batch.id"), nullable=False)
+    format = Column(Enum(ExportFormat), nullable=False)
+    with_answers = Column(Boolean, nullable=False, default=True)
+    template_id = Column(BigInteger, ForeignKey("export_template.id"))
+
+    status = Column(Enum(ExportJobStatus), nullable=False, default=ExportJobStatus.PENDING)
+
+    # Progress
+    total_documents = Column(Integer, nullable=False, default=0)
+    done_documents = Column(Integer, nullable=False, default=0)
+    failed_documents = Column(Integer, nullable=False, default=0)
+
+    result_path = Column(String(500))   # finished archive in local storage
+    error = Column(Text)
+    worker = Column(String(100))        # claim of the running worker: host:pid#nonce
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    batch = relationship("JSONBatch")
+    template = relationship("ExportTemplate")
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, BigInteger, String, DateTime, Boolean,
-    ForeignKey, Enum
+    ForeignKey, Enum, Integer
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -26,6 +26,8 @@ class ExportTemplate(Base):
 
     template_path = Column(String(500), nullable=False)  # path in storage
     is_active = Column(Boolean, nullable=False, default=True)
+    # Bumped on every update; part of export cache keys.
+    version = Column(Integer, nullable=False, default=1)
 
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
@@ -5,6 +5,13 @@ from sqlalchemy import (
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+import enum
+
+
+class ExportMaskType(str, enum.Enum):
+    NONE = "NONE"              # export the value as-is
+    HIDE_VALUE = "HIDE_VALUE"  # keep the label, blank the value
+    REDACT = "REDACT"          # replace the value with ***
 
 
 class FieldConfigSet(Base):
@@ -17,7 +24,29 @@ class FieldConfigSet(Base):
     name = Column(String(255), nullable=False)         # e.g. UI_Default
     description = Column(Text)
     is_default = Column(Boolean, nullable=False, default=False)
+    # Bumped on every change to the set or its items; part of export cache keys.
+    version = Column(Integer, nullable=False, default=1)
 
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     json_type = relationship("JSONType")
+
+
+class FieldConfig(Base):
+    __tablename__ = "field_config"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+
+    config_set_id = Column(BigInteger, ForeignKey("field_config_set.id"), nullable=False)
+
+    json_path = Column(String(500), nullable=False)
+    label = Column(String(255))
+
+    order_index = Column(Integer, nullable=False, default=0)
+    show_in_ui = Column(Boolean, nullable=False, default=True)
+    show_in_export = Column(Boolean, nullable=False, default=True)
+    required = Column(Boolean, nullable=False, default=False)
+
+    export_mask_type = Column(Enum(ExportMaskType), nullable=False, default=ExportMaskType.NONE)
+
+    config_set = relationship("FieldConfigSet")
@@ -1,9 +1,11 @@
 from sqlalchemy import (
-    Column, BigInteger, String, DateTime, ForeignKey, Enum, JSON
+    Column, BigInteger, String, DateTime, ForeignKey, Enum, JSON, Integer, Index,
+    LargeBinary
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.utils.json_compression import PackedJSON
 import enum
 
 
@@ -26,12 +28,34 @@ class JSONDocument(Base):
 
     status = Column(Enum(DocumentStatus), nullable=False, default=DocumentStatus.RAW)
 
-    raw_json = Column(JSON, nullable=False)
-    normalized_json = Column(JSON)
+    # Document bodies live in the JSON column or, with DOCUMENT_COMPRESSION
+    # on, compressed in the *_packed column; raw_json / normalized_json
+    # read and write whichever applies.
+    raw_json_plain = Column("raw_json", JSON(none_as_null=True))
+    raw_json_packed = Column(LargeBinary(length=2**32 - 1))
+    normalized_json_plain = Column("normalized_json", JSON(none_as_null=True))
+    normalized_json_packed = Column(LargeBinary(length=2**32 - 1))
+
+    raw_json = PackedJSON("raw_json_plain", "raw_json_packed")
+    normalized_json = PackedJSON("normalized_json_plain", "normalized_json_packed")
+
+    # sha256 of the canonical raw_json, set at ingest; used for duplicate
+    # detection and, with the mapping profile id/version, to tell what
+    # normalized_json was last produced from.
+    content_hash = Column(String(64))
+    # Set on documents uploaded with duplicates=flag: the earlier document
+    # of the same json_type with identical raw_json.
+    duplicate_of_id = Column(BigInteger, ForeignKey("json_document.id", ondelete="SET NULL"))
+    converted_profile_id = Column(BigInteger, ForeignKey("mapping_profile.id"))
+    converted_profile_version = Column(Integer)
 
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime)
 
+    __table_args__ = (
+        Index("ix_json_document_type_hash", "json_type_id", "content_hash"),
+    )
+
     batch = relationship("JSONBatch")
     json_type = relationship("JSONType")
     category = relationship("Category")
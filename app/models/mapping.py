@@ -25,6 +25,8 @@ class MappingProfile(Base):
 
     description = Column(Text)
     is_active = Column(Boolean, nullable=False, default=True)
+    # Bumped on every profile/rule change; keys the compiled plan cache.
+    version = Column(Integer, nullable=False, default=1)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     source_type = relationship("JSONType", foreign_keys=[source_type_id])
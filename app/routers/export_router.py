@@ -1,21 +1,73 @@
+import base64
+import json
+import os
+import tempfile
+import unicodedata
 from typing import List
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.db.connection import get_db
+from app.db.connection import get_db, SessionLocal
+from app.models.export_job import ExportJob, ExportJobStatus
 from app.models.export_template import ExportTemplate, ExportFormat
-from app.models.json_document import JSONDocument
+from app.models.json_documents import JSONDocument
 from app.schemas.export_template import (
     ExportTemplateCreate,
     ExportTemplateUpdate,
     ExportTemplateOut
 )
-from app.utils.export_service import generate_export
+from app.schemas.export_job import ExportJobOut
+from app.utils.artifact_cache import get_artifact_cache
+from app.utils.export_service import (
+    EXPORT_MEDIA_TYPES,
+    generate_export,
+    iter_batch_exports,
+    render_batch_merged,
+    render_export,
+)
+from app.utils.export_jobs import job_rates, submit_export_job
+from app.utils.zip_stream import iter_zip
 
 
 router = APIRouter(prefix="/export", tags=["export"])
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _content_disposition(file_name: str) -> str:
+    """
+    attachment header for any file name. Header values must be latin-1,
+    so non-ASCII names (template names such as "Física 物理") go in the
+    RFC 5987 filename* parameter, with an ASCII filename= fallback.
+    """
+    fallback = unicodedata.normalize("NFKD", file_name).encode("ascii", "ignore").decode("ascii")
+    fallback = "".join(
+        "_" if ch in '"\\' or not ch.isprintable() else ch for ch in fallback
+    ).strip() or "export"
+    if fallback == file_name:
+        return f'attachment; filename="{fallback}"'
+    encoded = quote(file_name, safe="")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{encoded}"
+
+
+def _file_response(data: bytes, file_name: str, media_type: str) -> StreamingResponse:
+    def chunks():
+        view = memoryview(data)
+        for start in range(0, len(view), STREAM_CHUNK_SIZE):
+            yield bytes(view[start:start + STREAM_CHUNK_SIZE])
+
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": _content_disposition(file_name),
+            "Content-Length": str(len(data)),
+        },
+    )
+
 
 # ---------------------------------------------------------
 # Templates
@@ -62,6 +114,7 @@ def update_template(template_id: int, payload: ExportTemplateUpdate, db: Session
     data = payload.dict(exclude_unset=True)
     for f, v in data.items():
         setattr(t, f, v)
+    t.version = (t.version or 0) + 1
 
     db.commit()
     db.refresh(t)
@@ -79,6 +132,14 @@ def delete_template(template_id: int, db: Session = Depends(get_db)):
     return None
 
 
+@router.get("/cache/stats")
+def export_cache_stats():
+    cache = get_artifact_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
 # ---------------------------------------------------------
 # Export document
 # ---------------------------------------------------------
@@ -87,21 +148,45 @@ def delete_template(template_id: int, db: Session = Depends(get_db)):
 def export_document(
     document_id: int,
     format: ExportFormat,
+    request: Request,
     with_answers: bool = True,
     template_id: int | None = None,
+    raw: bool = False,
     db: Session = Depends(get_db),
 ):
+    """
+    Export one document. Returns {"file_name", "file_data_base64"} by
+    default; with ?raw=true (or an Accept header naming the file's media
+    type) the file itself is streamed with a Content-Disposition header.
+    """
     doc = db.query(JSONDocument).get(document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    file_bytes, file_name = generate_export(
-        db=db,
-        document=doc,
-        export_format=format,
-        with_answers=with_answers,
-        template_id=template_id,
-    )
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if raw or media_type in request.headers.get("accept", ""):
+        try:
+            raw_bytes, file_name = render_export(
+                db=db,
+                document=doc,
+                export_format=format,
+                with_answers=with_answers,
+                template_id=template_id,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return _file_response(raw_bytes, file_name, media_type)
+
+    try:
+        file_bytes, file_name = generate_export(
+            db=db,
+            document=doc,
+            export_format=format,
+            with_answers=with_answers,
+            template_id=template_id,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
     return {
         "file_name": file_name,
@@ -121,24 +206,218 @@ def export_batch(
     template_id: int | None = None,
     db: Session = Depends(get_db),
 ):
-    docs = db.query(JSONDocument).filter(JSONDocument.batch_id == batch_id).all()
-    if not docs:
+    has_docs = db.query(JSONDocument.id).filter(JSONDocument.batch_id == batch_id).first()
+    if not has_docs:
         raise HTTPException(status_code=404, detail="No documents found in batch")
 
     outputs = []
 
-    for doc in docs:
-        file_bytes, file_name = generate_export(
-            db=db,
-            document=doc,
+    for item in iter_batch_exports(
+        db,
+        batch_id=batch_id,
+        export_format=format,
+        with_answers=with_answers,
+        template_id=template_id,
+    ):
+        if "error" in item:
+            raise HTTPException(status_code=400, detail=item["error"])
+        outputs.append({
+            "document_id": item["document_id"],
+            "file_name": item["file_name"],
+            "file_data_base64": base64.b64encode(item["data"]).decode("utf-8"),
+        })
+
+    return outputs
+
+
+@router.post("/batch/{batch_id}/zip")
+def export_batch_zip(
+    batch_id: int,
+    format: ExportFormat,
+    with_answers: bool = True,
+    template_id: int | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Stream a ZIP with one file per document plus manifest.json, rendering
+    documents as the archive is sent instead of building it in memory.
+    """
+    has_docs = db.query(JSONDocument.id).filter(JSONDocument.batch_id == batch_id).first()
+    if not has_docs:
+        raise HTTPException(status_code=404, detail="No documents found in batch")
+
+    def entries():
+        # The request-scoped session may be closed before the body is sent.
+        stream_db = SessionLocal()
+        manifest = []
+        try:
+            for item in iter_batch_exports(
+                stream_db,
+                batch_id=batch_id,
+                export_format=format,
+                with_answers=with_answers,
+                template_id=template_id,
+            ):
+                if "error" in item:
+                    manifest.append({"document_id": item["document_id"], "error": item["error"]})
+                    continue
+
+                entry_name = f"{item['document_id']}_{item['file_name']}"
+                manifest.append({
+                    "document_id": item["document_id"],
+                    "file_name": entry_name,
+                    "size": len(item["data"]),
+                })
+                yield entry_name, item["data"]
+        finally:
+            stream_db.close()
+
+        yield "manifest.json", json.dumps({
+            "batch_id": batch_id,
+            "format": format.value,
+            "with_answers": with_answers,
+            "documents": manifest,
+        }, indent=2).encode("utf-8")
+
+    return StreamingResponse(
+        iter_zip(entries()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch_id}_{format.value.lower()}.zip"'},
+    )
+
+
+@router.post("/batch/{batch_id}/merged")
+def export_batch_merged(
+    batch_id: int,
+    format: ExportFormat,
+    with_answers: bool = True,
+    template_id: int | None = None,
+    page_per_document: bool = False,
+    db: Session = Depends(get_db),
+):
+    """
+    One combined PDF/DOCX with every document of the batch, e.g. a whole
+    question paper for printing. Documents that could not be exported are
+    counted in the X-Export-Skipped header.
+    """
+    has_docs = db.query(JSONDocument.id).filter(JSONDocument.batch_id == batch_id).first()
+    if not has_docs:
+        raise HTTPException(status_code=404, detail="No documents found in batch")
+
+    out = tempfile.TemporaryFile()
+    try:
+        summary = render_batch_merged(
+            db,
+            batch_id=batch_id,
             export_format=format,
             with_answers=with_answers,
+            out=out,
             template_id=template_id,
+            page_per_document=page_per_document,
         )
-        outputs.append({
-            "document_id": doc.id,
-            "file_name": file_name,
-            "file_data_base64": file_bytes,
-        })
+    except ValueError as exc:
+        out.close()
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    return outputs
+    size = out.tell()
+    out.seek(0)
+
+    def chunks():
+        try:
+            while True:
+                chunk = out.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            out.close()
+
+    return StreamingResponse(
+        chunks(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": _content_disposition(summary["file_name"]),
+            "Content-Length": str(size),
+            "X-Export-Documents": str(summary["documents"]),
+            "X-Export-Skipped": str(len(summary["errors"])),
+        },
+    )
+
+
+# ---------------------------------------------------------
+# Background export jobs
+# ---------------------------------------------------------
+
+def _job_out(job: ExportJob) -> ExportJobOut:
+    out = ExportJobOut.from_orm(job)
+    out.docs_per_second, out.eta_seconds = job_rates(job)
+    return out
+
+
+@router.post(
+    "/jobs/batch/{batch_id}",
+    response_model=ExportJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def submit_batch_export_job(
+    batch_id: int,
+    format: ExportFormat,
+    with_answers: bool = True,
+    template_id: int | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Queue a batch export to be rendered by a background worker. Poll
+    GET /export/jobs/{id} for progress and download the ZIP when DONE.
+    """
+    has_docs = db.query(JSONDocument.id).filter(JSONDocument.batch_id == batch_id).first()
+    if not has_docs:
+        raise HTTPException(status_code=404, detail="No documents found in batch")
+
+    job = submit_export_job(
+        db,
+        batch_id=batch_id,
+        export_format=format,
+        with_answers=with_answers,
+        template_id=template_id,
+    )
+    return _job_out(job)
+
+
+@router.get("/jobs", response_model=List[ExportJobOut])
+def list_export_jobs(
+    db: Session = Depends(get_db),
+    batch_id: int | None = None,
+    job_status: ExportJobStatus | None = None,
+):
+    q = db.query(ExportJob)
+    if batch_id:
+        q = q.filter(ExportJob.batch_id == batch_id)
+    if job_status:
+        q = q.filter(ExportJob.status == job_status)
+    return [_job_out(job) for job in q.order_by(ExportJob.id.desc()).all()]
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobOut)
+def get_export_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(ExportJob).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return _job_out(job)
+
+
+@router.get("/jobs/{job_id}/download")
+def download_export_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(ExportJob).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.status != ExportJobStatus.DONE:
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status.value}")
+    if not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=410, detail="Export job result is no longer available")
+
+    return FileResponse(
+        job.result_path,
+        media_type="application/zip",
+        filename=f"batch_{job.batch_id}_{job.format.value.lower()}.zip",
+    )
@@ -13,10 +13,20 @@ from app.schemas.field_config import (
     FieldConfigUpdate,
     FieldConfigOut,
 )
+from app.utils.export_service import invalidate_field_plan
 
 router = APIRouter(prefix="/field-config", tags=["field-config"])
 
 
+def _bump_set_version(db: Session, set_id: int):
+    """Mark a config set as changed so cached exports built from it miss."""
+    db.query(FieldConfigSet).filter(FieldConfigSet.id == set_id).update(
+        {FieldConfigSet.version: FieldConfigSet.version + 1},
+        synchronize_session=False,
+    )
+    invalidate_field_plan(set_id)
+
+
 # ---------------------------------------------------------
 # FIELD CONFIG SETS
 # ---------------------------------------------------------
@@ -75,6 +85,8 @@ def update_config_set(set_id: int, payload: FieldConfigSetUpdate, db: Session =
 
     for f, v in incoming.items():
         setattr(obj, f, v)
+    obj.version = (obj.version or 0) + 1
+    invalidate_field_plan(set_id)
 
     db.commit()
     db.refresh(obj)
@@ -89,6 +101,7 @@ def delete_config_set(set_id: int, db: Session = Depends(get_db)):
 
     db.delete(obj)
     db.commit()
+    invalidate_field_plan(set_id)
     return None
 
 
@@ -109,6 +122,7 @@ def create_field_config(payload: FieldConfigCreate, db: Session = Depends(get_db
         export_mask_type=payload.export_mask_type,
     )
     db.add(obj)
+    _bump_set_version(db, payload.config_set_id)
     db.commit()
     db.refresh(obj)
     return obj
@@ -137,6 +151,7 @@ def update_field_config(
     incoming = payload.dict(exclude_unset=True)
     for f, v in incoming.items():
         setattr(obj, f, v)
+    _bump_set_version(db, obj.config_set_id)
 
     db.commit()
     db.refresh(obj)
@@ -150,5 +165,6 @@ def delete_field_config(config_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Field config item not found")
 
     db.delete(obj)
+    _bump_set_version(db, obj.config_set_id)
     db.commit()
     return None
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 
 from app.db.connection import get_db
-from app.models.json_document import JSONDocument, DocumentStatus
+from app.models.json_documents import JSONDocument, DocumentStatus
 from app.models.category import Category
 from app.schemas.json_document import (
     JSONDocumentOut,
@@ -1,14 +1,25 @@
-from typing import List, Any, Optional
+import time
+from typing import List, Any, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.db.connection import get_db
 from app.models.json_batch import JSONBatch
-from app.models.json_document import JSONDocument, DocumentStatus
+from app.models.json_documents import DocumentStatus
 from app.schemas.json_batch import JSONBatchCreate, JSONBatchOut
 from app.schemas.json_document import JSONDocumentOut
+from app.utils.document_ingest import (
+    DocumentInserter,
+    DuplicateMode,
+    create_batch,
+    discard_batch,
+    document_row,
+)
+from app.utils.json_stream import ARRAY, NDJSON, JSONStreamError, JSONStreamParser
 
 router = APIRouter(prefix="/batches", tags=["batches"])
 
@@ -28,24 +39,67 @@ class BatchUploadRequest(BaseModel):
 
 class BatchUploadResult(BaseModel):
     batch: JSONBatchOut
+    # Stored documents; duplicates left out by duplicates=skip/link are not listed
     documents: List[JSONDocumentOut]
+    duplicate_count: int = 0
+    # Document INSERT throughput for this upload
+    insert_seconds: Optional[float] = None
+    docs_per_second: Optional[float] = None
 
     class Config:
         orm_mode = True
 
 
+class BatchUploadSummary(BaseModel):
+    batch: JSONBatchOut
+    # Documents stored in this batch
+    document_count: int
+    # In upload order; with duplicates=link a duplicate contributes the
+    # existing document's id, with duplicates=skip nothing
+    document_ids: List[int]
+    duplicate_count: int = 0
+    # Duplicates reported by the id of an existing document (duplicates=link)
+    linked_count: int = 0
+    elapsed_seconds: float
+    insert_seconds: float
+    docs_per_second: Optional[float] = None
+
+
+class StreamUploadResult(BaseModel):
+    batch: JSONBatchOut
+    # Documents read from the stream, duplicates included
+    document_count: int
+    duplicate_count: int = 0
+    elapsed_seconds: float
+    insert_seconds: float
+    docs_per_second: Optional[float] = None
+
+
 # ----- Endpoints -----
 
 
 @router.post(
     "/upload-json",
-    response_model=BatchUploadResult,
+    response_model=Union[BatchUploadResult, BatchUploadSummary],
     status_code=status.HTTP_201_CREATED,
 )
 def upload_json_batch(
     payload: BatchUploadRequest,
+    response: Literal["full", "summary"] = "full",
+    duplicates: DuplicateMode = DuplicateMode.ALLOW,
     db: Session = Depends(get_db),
 ):
+    """
+    Create a batch with its documents. response=summary returns only the
+    batch, the new document ids and counts/timing instead of echoing
+    every document (raw_json included) back.
+
+    duplicates decides what happens to documents whose raw_json is
+    already stored for the json_type (or earlier in this upload): allow
+    stores them, skip drops them, link drops them and reports the
+    existing id, flag stores them with duplicate_of_id set.
+    """
+    started = time.perf_counter()
     if not payload.documents:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -65,28 +119,163 @@ def upload_json_batch(
     db.add(batch)
     db.flush()  # get batch.id without full commit
 
-    # Create documents
-    doc_objects: List[JSONDocument] = []
-    for item in payload.documents:
-        doc = JSONDocument(
-            batch_id=batch.id,
-            json_type_id=batch_data.json_type_id,
-            category_id=item.category_id or batch_data.category_id,
-            name=item.name,
-            raw_json=item.raw_json,
-            status=DocumentStatus.RAW,
-        )
-        db.add(doc)
-        doc_objects.append(doc)
+    # Create documents: one multi-row INSERT per chunk, one transaction
+    inserter = DocumentInserter(db, batch.id, batch_data.json_type_id, duplicates=duplicates)
+    chunk_size = max(1, settings.INGEST_CHUNK_SIZE)
+    summary = response == "summary"
+    documents: List[JSONDocumentOut] = []
+    document_ids: List[int] = []
+    linked_count = 0
+    for start in range(0, len(payload.documents), chunk_size):
+        rows = [
+            {
+                "batch_id": batch.id,
+                "json_type_id": batch_data.json_type_id,
+                "category_id": item.category_id or batch_data.category_id,
+                "name": item.name,
+                "raw_json": item.raw_json,
+                "status": DocumentStatus.RAW,
+            }
+            for item in payload.documents[start:start + chunk_size]
+        ]
+        results = inserter.insert(rows)
+        if summary:
+            document_ids.extend(r.id for r in results if r.id is not None)
+            linked_count += sum(
+                1 for r in results if r.id is not None and r.created_at is None
+            )
+            continue
+        for row, result in zip(rows, results):
+            if result.created_at is None:
+                continue  # not stored
+            row["duplicate_of_id"] = result.duplicate_of_id
+            documents.append(
+                JSONDocumentOut(id=result.id, created_at=result.created_at, **row)
+            )
 
     db.commit()
     db.refresh(batch)
-    for doc in doc_objects:
-        db.refresh(doc)
+
+    if summary:
+        return BatchUploadSummary(
+            batch=batch,
+            document_count=inserter.inserted,
+            document_ids=document_ids,
+            duplicate_count=inserter.duplicate_count,
+            linked_count=linked_count,
+            elapsed_seconds=round(time.perf_counter() - started, 3),
+            insert_seconds=round(inserter.insert_seconds, 3),
+            docs_per_second=inserter.docs_per_second,
+        )
 
     return BatchUploadResult(
         batch=batch,
-        documents=doc_objects,
+        documents=documents,
+        duplicate_count=inserter.duplicate_count,
+        insert_seconds=round(inserter.insert_seconds, 3),
+        docs_per_second=inserter.docs_per_second,
+    )
+
+
+def _stream_item_row(batch: JSONBatchOut, obj: Any, raw: bool, index: int) -> dict:
+    if raw:
+        return document_row(batch, obj)
+    if not isinstance(obj, dict) or "raw_json" not in obj:
+        raise ValueError(
+            f"Document {index}: expected an object with raw_json (or pass raw=true)"
+        )
+    try:
+        item = JSONUploadItem.parse_obj(obj)
+    except ValidationError as exc:
+        raise ValueError(f"Document {index}: {exc}")
+    return document_row(batch, item.raw_json, name=item.name, category_id=item.category_id)
+
+
+@router.post(
+    "/upload-stream",
+    response_model=StreamUploadResult,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_json_stream(
+    request: Request,
+    name: str,
+    json_type_id: int,
+    category_id: Optional[int] = None,
+    source: Optional[str] = None,
+    uploaded_by: Optional[str] = None,
+    notes: Optional[str] = None,
+    raw: bool = False,
+    duplicates: DuplicateMode = DuplicateMode.ALLOW,
+    db: Session = Depends(get_db),
+):
+    """
+    Upload a batch as a stream instead of one BatchUploadRequest body.
+
+    The body is NDJSON (Content-Type application/x-ndjson) or a top-level
+    JSON array, of upload items ({"raw_json", "name", "category_id"}) or,
+    with raw=true, of the documents themselves. Batch fields come from
+    the query string. Documents are parsed as they arrive and inserted
+    INGEST_CHUNK_SIZE at a time, so memory stays bounded by the chunk
+    rather than the upload. The upload is all or nothing: on a malformed
+    document the batch and anything already inserted are removed.
+    duplicates works as for /upload-json.
+    """
+    started = time.perf_counter()
+    content_type = request.headers.get("content-type", "")
+    fmt = NDJSON if "ndjson" in content_type or "jsonlines" in content_type else ARRAY
+    chunk_size = max(1, settings.INGEST_CHUNK_SIZE)
+
+    batch = await run_in_threadpool(create_batch, db, JSONBatchCreate(
+        name=name,
+        json_type_id=json_type_id,
+        category_id=category_id,
+        source=source,
+        uploaded_by=uploaded_by,
+        notes=notes,
+    ))
+
+    parser = JSONStreamParser(fmt, max_document_bytes=settings.INGEST_MAX_DOCUMENT_BYTES)
+    inserter = DocumentInserter(
+        db, batch.id, json_type_id, commit_chunks=True, duplicates=duplicates
+    )
+    pending: List[dict] = []
+    count = 0
+
+    def consume(chunk: Optional[bytes]):
+        # Parsing, row building and inserts are CPU/DB work; run them off
+        # the event loop. chunk None means the body has ended.
+        nonlocal count
+        documents = parser.close() if chunk is None else parser.feed(chunk)
+        for obj in documents:
+            count += 1
+            pending.append(_stream_item_row(batch, obj, raw, count))
+        while len(pending) >= chunk_size or (chunk is None and pending):
+            rows = pending[:chunk_size]
+            del pending[:chunk_size]
+            inserter.insert(rows)
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(consume, chunk)
+        await run_in_threadpool(consume, None)
+        if count == 0:
+            raise ValueError("No documents provided")
+    except (JSONStreamError, ValueError) as exc:
+        await run_in_threadpool(discard_batch, db, batch.id)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    except Exception:
+        # Client went away or the database failed; don't leave half a batch.
+        await run_in_threadpool(discard_batch, db, batch.id)
+        raise
+
+    return StreamUploadResult(
+        batch=batch,
+        document_count=count,
+        duplicate_count=inserter.duplicate_count,
+        elapsed_seconds=round(time.perf_counter() - started, 3),
+        insert_seconds=round(inserter.insert_seconds, 3),
+        docs_per_second=inserter.docs_per_second,
     )
 
 
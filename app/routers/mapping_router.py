@@ -1,15 +1,18 @@
+import json
+from datetime import datetime
 from typing import List, Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.db.connection import get_db
+from app.db.connection import get_db, SessionLocal
 from app.models.mapping import (
     MappingProfile,
     MappingRule,
     MappingAction,
 )
-from app.models.json_document import JSONDocument
+from app.models.json_documents import JSONDocument, DocumentStatus
 from app.schemas.mapping import (
     MappingProfileCreate,
     MappingProfileUpdate,
@@ -18,7 +21,19 @@ from app.schemas.mapping import (
     MappingRuleUpdate,
     MappingRuleOut,
 )
-from app.utils.mapping_engine import apply_mapping_profile
+from app.utils.content_hash import content_hash
+from app.utils.conversion_executor import (
+    ConversionExecutor,
+    convert_and_persist_batch,
+    iter_batch_documents,
+)
+from app.utils.mapping_engine import (
+    bump_profile_version,
+    execute_plan,
+    get_compiled_profile,
+    invalidate_profile,
+)
+from app.utils.transform_expr import TransformError, validate_expression
 
 router = APIRouter(prefix="/mapping", tags=["mapping"])
 
@@ -64,9 +79,11 @@ def update_profile(profile_id: int, payload: MappingProfileUpdate, db: Session =
     data = payload.dict(exclude_unset=True)
     for field, value in data.items():
         setattr(obj, field, value)
+    obj.version = (obj.version or 0) + 1
 
     db.commit()
     db.refresh(obj)
+    invalidate_profile(profile_id)
     return obj
 
 
@@ -78,6 +95,7 @@ def delete_profile(profile_id: int, db: Session = Depends(get_db)):
 
     db.delete(obj)
     db.commit()
+    invalidate_profile(profile_id)
     return None
 
 
@@ -85,8 +103,22 @@ def delete_profile(profile_id: int, db: Session = Depends(get_db)):
 # Rules
 # ---------------------------------------------------------
 
+def _validate_transform(expr: str | None):
+    if not expr:
+        return
+    try:
+        validate_expression(expr)
+    except TransformError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid transform_expr: {exc}",
+        )
+
+
 @router.post("/rules", response_model=MappingRuleOut, status_code=status.HTTP_201_CREATED)
 def create_rule(payload: MappingRuleCreate, db: Session = Depends(get_db)):
+    _validate_transform(payload.transform_expr)
+
     obj = MappingRule(
         profile_id=payload.profile_id,
         action=payload.action,
@@ -97,6 +129,7 @@ def create_rule(payload: MappingRuleCreate, db: Session = Depends(get_db)):
         order_index=payload.order_index,
     )
     db.add(obj)
+    bump_profile_version(db, payload.profile_id)
     db.commit()
     db.refresh(obj)
     return obj
@@ -119,8 +152,10 @@ def update_rule(rule_id: int, payload: MappingRuleUpdate, db: Session = Depends(
         raise HTTPException(status_code=404, detail="Rule not found")
 
     data = payload.dict(exclude_unset=True)
+    _validate_transform(data.get("transform_expr"))
     for field, value in data.items():
         setattr(obj, field, value)
+    bump_profile_version(db, obj.profile_id)
 
     db.commit()
     db.refresh(obj)
@@ -134,6 +169,7 @@ def delete_rule(rule_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Rule not found")
 
     db.delete(obj)
+    bump_profile_version(db, obj.profile_id)
     db.commit()
     return None
 
@@ -143,7 +179,12 @@ def delete_rule(rule_id: int, db: Session = Depends(get_db)):
 # ---------------------------------------------------------
 
 @router.post("/convert-document/{profile_id}/{document_id}", response_model=Any)
-def convert_document(profile_id: int, document_id: int, db: Session = Depends(get_db)):
+def convert_document(
+    profile_id: int,
+    document_id: int,
+    persist: bool = False,
+    db: Session = Depends(get_db),
+):
     profile = db.query(MappingProfile).get(profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
@@ -152,12 +193,28 @@ def convert_document(profile_id: int, document_id: int, db: Session = Depends(ge
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    result_json = apply_mapping_profile(profile_id, doc.raw_json, db)
+    plan = get_compiled_profile(profile_id, db)
+    errors = []
+    result_json = execute_plan(plan, doc.raw_json, errors)
+
+    if persist:
+        if errors:
+            doc.status = DocumentStatus.ERROR
+        else:
+            doc.normalized_json = result_json
+            doc.status = DocumentStatus.CONVERTED
+            doc.content_hash = content_hash(doc.raw_json)
+            doc.converted_profile_id = plan.profile_id
+            doc.converted_profile_version = plan.version
+        doc.updated_at = datetime.utcnow()
+        db.commit()
+
     return {
         "document_id": document_id,
         "source_type_id": profile.source_type_id,
         "target_type_id": profile.target_type_id,
         "converted_json": result_json,
+        "errors": errors,
     }
 
 
@@ -165,22 +222,81 @@ def convert_document(profile_id: int, document_id: int, db: Session = Depends(ge
 # Convert a whole batch
 # ---------------------------------------------------------
 
-@router.post("/convert-batch/{profile_id}/{batch_id}", response_model=List[Any])
-def convert_batch(profile_id: int, batch_id: int, db: Session = Depends(get_db)):
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+@router.post("/convert-batch/{profile_id}/{batch_id}", response_model=Any)
+def convert_batch(
+    profile_id: int,
+    batch_id: int,
+    request: Request,
+    stream: bool = False,
+    persist: bool = False,
+    force: bool = False,
+    db: Session = Depends(get_db),
+):
     profile = db.query(MappingProfile).get(profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
+    if persist:
+        return _persist_convert_batch(profile_id, batch_id, db, force)
+
+    if stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return _stream_convert_batch(profile_id, batch_id, db)
+
     docs = db.query(JSONDocument).filter(JSONDocument.batch_id == batch_id).all()
     if not docs:
         raise HTTPException(status_code=404, detail="No documents found in batch")
 
-    results = []
-    for doc in docs:
-        converted = apply_mapping_profile(profile_id, doc.raw_json, db)
-        results.append({
-            "document_id": doc.id,
-            "converted_json": converted,
-        })
+    # Rules are loaded and compiled once for the whole batch.
+    plan = get_compiled_profile(profile_id, db)
+
+    with ConversionExecutor(plan) as executor:
+        results = list(executor.convert((doc.id, doc.raw_json) for doc in docs))
 
     return results
+
+
+def _persist_convert_batch(profile_id: int, batch_id: int, db: Session, force: bool) -> dict:
+    """
+    Convert a batch, write results back and return counts/throughput.
+    Unchanged documents are skipped unless force is set.
+    """
+    has_docs = (
+        db.query(JSONDocument.id)
+        .filter(JSONDocument.batch_id == batch_id)
+        .first()
+    )
+    if not has_docs:
+        raise HTTPException(status_code=404, detail="No documents found in batch")
+
+    plan = get_compiled_profile(profile_id, db)
+    return convert_and_persist_batch(db, plan, batch_id, force=force)
+
+
+def _stream_convert_batch(profile_id: int, batch_id: int, db: Session) -> StreamingResponse:
+    """Convert a batch as NDJSON, one line per document as soon as it is ready."""
+    has_docs = (
+        db.query(JSONDocument.id)
+        .filter(JSONDocument.batch_id == batch_id)
+        .first()
+    )
+    if not has_docs:
+        raise HTTPException(status_code=404, detail="No documents found in batch")
+
+    plan = get_compiled_profile(profile_id, db)
+
+    def generate():
+        # The request-scoped session may be closed before the body is sent,
+        # so the cursor gets a session of its own.
+        stream_db = SessionLocal()
+        try:
+            documents = iter_batch_documents(stream_db, batch_id)
+            with ConversionExecutor(plan) as executor:
+                for result in executor.convert(documents):
+                    yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from app.models.export_template import ExportFormat
+from app.models.export_job import ExportJobStatus
+
+
+class ExportJobOut(BaseModel):
+    id: int
+    batch_id: int
+    format: ExportFormat
+    with_answers: bool
+    template_id: Optional[int] = None
+
+    status: ExportJobStatus
+    total_documents: int
+    done_documents: int
+    failed_documents: int
+    error: Optional[str] = None
+
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    # Derived from the counters and timestamps above
+    docs_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+
+    class Config:
+        orm_mode = True
@@ -25,6 +25,7 @@ class ExportTemplateUpdate(BaseModel):
 
 class ExportTemplateOut(ExportTemplateBase):
     id: int
+    version: int
     created_at: datetime
 
     class Config:
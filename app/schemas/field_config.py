@@ -22,6 +22,7 @@ class FieldConfigSetUpdate(BaseModel):
 
 class FieldConfigSetOut(FieldConfigSetBase):
     id: int
+    version: int
     created_at: datetime
 
     class Config:
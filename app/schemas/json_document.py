@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, Any
 from datetime import datetime
-from app.models.json_document import DocumentStatus
+from app.models.json_documents import DocumentStatus
 
 
 class JSONDocumentBase(BaseModel):
@@ -29,6 +29,7 @@ class JSONDocumentUpdate(BaseModel):
 
 class JSONDocumentOut(JSONDocumentBase):
     id: int
+    duplicate_of_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
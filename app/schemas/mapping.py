@@ -26,6 +26,7 @@ class MappingProfileUpdate(BaseModel):
 
 class MappingProfileOut(MappingProfileBase):
     id: int
+    version: int
     created_at: datetime
 
     class Config:
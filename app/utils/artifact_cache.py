@@ -0,0 +1,168 @@
+# app/utils/artifact_cache.py
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Optional
+
+from app.config import settings
+
+
+class ArtifactCache:
+    """
+    Content-addressed, size-bounded disk cache of rendered export files.
+
+    Keys are derived from everything that affects the rendered bytes
+    (document content hash, template id/version/file stamp, field config set
+    id/version, format, with_answers), so a change to any of them simply
+    produces a new key; stale entries are never hit and age out through
+    LRU eviction. File mtimes double as the LRU clock: a hit touches the
+    file, eviction removes the oldest files first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        template_id: int,
+        template_version: int,
+        config_set_id: Optional[int],
+        config_set_version: Optional[int],
+        export_format: str,
+        with_answers: bool,
+        template_stamp: str = "",
+    ) -> str:
+        raw = "|".join(str(part) for part in (
+            content_hash, template_id, template_version,
+            config_set_id, config_set_version, export_format, int(with_answers),
+            template_stamp,
+        ))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file and rename, so readers never see partial files.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        with self._lock:
+            self.writes += 1
+            self._size = self._current_size() + len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._scan())
+        return self._size
+
+    def _scan(self):
+        try:
+            shards = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime
+
+    def _evict(self):
+        # Drop least recently used files until 90% of the budget is free.
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        for path, file_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            size -= file_size
+            self.evictions += 1
+        self._size = size
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._scan()):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "size_bytes": self._current_size(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[ArtifactCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> Optional[ArtifactCache]:
+    """The process-wide artifact cache, or None when it is disabled."""
+    global _cache
+    if not settings.EXPORT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactCache(settings.EXPORT_CACHE_DIR, settings.EXPORT_CACHE_MAX_BYTES)
+        return _cache
@@ -0,0 +1,15 @@
+# app/utils/content_hash.py
+
+import hashlib
+import json
+from typing import Any
+
+
+def canonical_json(value: Any) -> str:
+    """Serialise value with sorted keys and no whitespace, so equal documents match."""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def content_hash(value: Any) -> str:
+    """SHA-256 hex digest of the canonical JSON form of value."""
+    return hashlib.sha256(canonical_json(value).encode("utf-8")).hexdigest()
@@ -0,0 +1,406 @@
+# app/utils/conversion_executor.py
+
+import multiprocessing
+import pickle
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, load_only
+
+from app.config import settings
+from app.db.connection import SessionLocal
+from app.models.json_batch import JSONBatch
+from app.models.json_documents import JSONDocument, DocumentStatus
+from app.utils.content_hash import content_hash
+from app.utils.json_compression import storage_values
+from app.utils.mapping_engine import CompiledProfile, execute_plan
+
+
+# (document_id, raw_json)
+DocumentInput = Tuple[int, Any]
+
+
+# ---------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------
+
+# Plans by (profile_id, version), unpickled once per worker process and
+# reused across chunks and requests. A profile change bumps its version,
+# so a cached plan is never stale.
+_worker_plans: "OrderedDict[Tuple[int, int], CompiledProfile]" = OrderedDict()
+_WORKER_PLAN_CACHE_SIZE = 32
+
+
+def _worker_plan(key: Tuple[int, int], payload: bytes) -> CompiledProfile:
+    plan = _worker_plans.get(key)
+    if plan is None:
+        plan = pickle.loads(payload)
+        _worker_plans[key] = plan
+        while len(_worker_plans) > _WORKER_PLAN_CACHE_SIZE:
+            _worker_plans.popitem(last=False)
+    else:
+        _worker_plans.move_to_end(key)
+    return plan
+
+
+def _convert_chunk(key: Tuple[int, int], payload: bytes, chunk: List[DocumentInput]) -> List[dict]:
+    return convert_documents(_worker_plan(key, payload), chunk)
+
+
+def convert_documents(plan: CompiledProfile, chunk: Iterable[DocumentInput]) -> List[dict]:
+    """Convert documents in-process, in order."""
+    results = []
+    for document_id, raw_json in chunk:
+        errors: List[dict] = []
+        try:
+            converted = execute_plan(plan, raw_json, errors)
+        except Exception as exc:
+            # One malformed document must not sink the rest of the batch.
+            converted = None
+            errors.append({"rule_id": None, "target_json_path": None, "error": str(exc)})
+        results.append({
+            "document_id": document_id,
+            "converted_json": converted,
+            "errors": errors,
+        })
+    return results
+
+
+# ---------------------------------------------------------
+# Document source
+# ---------------------------------------------------------
+
+def iter_batch_documents(
+    db: Session,
+    batch_id: int,
+    chunk_size: Optional[int] = None,
+) -> Iterator[DocumentInput]:
+    """
+    Stream (id, raw_json) for every document of a batch in id order.
+    Rows are fetched through a server-side cursor chunk_size at a time and
+    expunged from the session as soon as they are read, so memory stays
+    bounded by the chunk size rather than the batch size.
+    """
+    query = (
+        db.query(JSONDocument)
+        .filter(JSONDocument.batch_id == batch_id)
+        .order_by(JSONDocument.id.asc())
+        .yield_per(chunk_size or settings.CONVERT_CHUNK_SIZE)
+    )
+    for doc in query:
+        item = (doc.id, doc.raw_json)
+        db.expunge(doc)
+        yield item
+
+
+# ---------------------------------------------------------
+# Executor
+# ---------------------------------------------------------
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> ProcessPoolExecutor:
+    """
+    The process-wide pool of CONVERT_WORKERS spawned workers, started on
+    first use and shared by every request, so workers (and the plans they
+    have cached) outlive a single conversion.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.CONVERT_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_conversion_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    # A worker died; the next conversion starts a fresh pool.
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ConversionExecutor:
+    """
+    Runs a compiled profile over documents, either in-process or on the
+    shared conversion pool. Documents are split into chunks of chunk_size;
+    at most two chunks per worker are in flight, and results are yielded
+    in the order the documents were given. Workers receive the plan with
+    each chunk but only unpickle it the first time they see its
+    (profile_id, version).
+
+        with ConversionExecutor(plan) as executor:
+            for result in executor.convert(docs):
+                ...
+    """
+
+    def __init__(
+        self,
+        plan: CompiledProfile,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.plan = plan
+        self.workers = max(1, workers or settings.CONVERT_WORKERS)
+        self.chunk_size = max(1, chunk_size or settings.CONVERT_CHUNK_SIZE)
+        self._plan_key = (plan.profile_id, plan.version)
+        self._plan_payload: Optional[bytes] = None
+        self._in_flight: deque = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        # The pool is shared; only drop this executor's unstarted chunks
+        # (e.g. when a streaming client went away).
+        while self._in_flight:
+            self._in_flight.popleft().cancel()
+
+    def _submit(self, pool: ProcessPoolExecutor, chunk: List[DocumentInput]):
+        if self._plan_payload is None:
+            self._plan_payload = pickle.dumps(self.plan, protocol=pickle.HIGHEST_PROTOCOL)
+        self._in_flight.append(
+            pool.submit(_convert_chunk, self._plan_key, self._plan_payload, chunk)
+        )
+
+    def convert_chunks(self, documents: Iterable[DocumentInput]) -> Iterator[List[dict]]:
+        """Yield converted results chunk by chunk, in document order."""
+        chunks = _chunked(documents, self.chunk_size)
+
+        if self.workers == 1:
+            for chunk in chunks:
+                yield convert_documents(self.plan, chunk)
+            return
+
+        first = next(chunks, None)
+        if first is None:
+            return
+        second = next(chunks, None)
+        if second is None:
+            # A single chunk isn't worth starting a pool for.
+            yield convert_documents(self.plan, first)
+            return
+
+        pool = get_conversion_pool()
+        in_flight = self._in_flight
+        try:
+            self._submit(pool, first)
+            self._submit(pool, second)
+            for chunk in chunks:
+                if len(in_flight) >= self.workers * 2:
+                    yield in_flight.popleft().result()
+                self._submit(pool, chunk)
+            while in_flight:
+                yield in_flight.popleft().result()
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+
+    def convert(self, documents: Iterable[DocumentInput]) -> Iterator[dict]:
+        """Yield one result per document, in document order."""
+        for chunk in self.convert_chunks(documents):
+            yield from chunk
+
+
+# ---------------------------------------------------------
+# Persisting results
+# ---------------------------------------------------------
+
+def persist_results(
+    db: Session,
+    plan: CompiledProfile,
+    results: List[dict],
+    hashes: Optional[Dict[int, str]] = None,
+    json_type_id: Optional[int] = None,
+):
+    """
+    Write a chunk of conversion results back with one bulk UPDATE.
+    Successful documents get normalized_json, status CONVERTED and the
+    raw_json hash / profile version they were produced from; documents
+    with errors are marked ERROR and keep their previous normalized_json.
+    json_type_id picks the compression dictionary. The caller commits.
+    """
+    now = datetime.utcnow()
+    mappings = []
+    for result in results:
+        document_id = result["document_id"]
+        if result["errors"]:
+            mappings.append({
+                "id": document_id,
+                "status": DocumentStatus.ERROR,
+                "updated_at": now,
+            })
+        else:
+            plain, packed = storage_values(result["converted_json"], json_type_id)
+            mappings.append({
+                "id": document_id,
+                "normalized_json_plain": plain,
+                "normalized_json_packed": packed,
+                "status": DocumentStatus.CONVERTED,
+                "content_hash": (hashes or {}).get(document_id),
+                "converted_profile_id": plan.profile_id,
+                "converted_profile_version": plan.version,
+                "updated_at": now,
+            })
+    db.bulk_update_mappings(JSONDocument, mappings)
+
+
+def up_to_date_filter(plan: CompiledProfile):
+    """
+    SQL condition for documents already converted by this profile
+    version. raw_json is never changed after insert, so a stored
+    content_hash plus matching profile id/version means normalized_json
+    is current, without reading or hashing raw_json.
+    """
+    return and_(
+        JSONDocument.status == DocumentStatus.CONVERTED,
+        JSONDocument.converted_profile_id == plan.profile_id,
+        JSONDocument.converted_profile_version == plan.version,
+        JSONDocument.content_hash.isnot(None),
+    )
+
+
+def _needs_conversion_filter(plan: CompiledProfile):
+    # The negation of up_to_date_filter, spelled out so NULL columns
+    # count as "needs conversion" rather than dropping out of NOT (...).
+    return or_(
+        JSONDocument.status != DocumentStatus.CONVERTED,
+        JSONDocument.converted_profile_id.is_(None),
+        JSONDocument.converted_profile_id != plan.profile_id,
+        JSONDocument.converted_profile_version.is_(None),
+        JSONDocument.converted_profile_version != plan.version,
+        JSONDocument.content_hash.is_(None),
+    )
+
+
+def _iter_changed_documents(
+    db: Session,
+    batch_id: int,
+    plan: CompiledProfile,
+    chunk_size: Optional[int],
+    hashes: Dict[int, str],
+    counts: Dict[str, int],
+    force: bool,
+) -> Iterator[DocumentInput]:
+    in_batch = db.query(JSONDocument.id).filter(JSONDocument.batch_id == batch_id)
+    counts["total"] = in_batch.count()
+    if not force:
+        counts["skipped"] = in_batch.filter(up_to_date_filter(plan)).count()
+
+    query = (
+        db.query(JSONDocument)
+        .options(load_only(
+            JSONDocument.id,
+            JSONDocument.json_type_id,
+            JSONDocument.content_hash,
+            JSONDocument.raw_json_plain,
+            JSONDocument.raw_json_packed,
+        ))
+        .filter(JSONDocument.batch_id == batch_id)
+    )
+    if not force:
+        query = query.filter(_needs_conversion_filter(plan))
+    query = query.order_by(JSONDocument.id.asc()).yield_per(chunk_size or settings.CONVERT_CHUNK_SIZE)
+
+    for doc in query:
+        # Documents from before hashes were stored at ingest get one now.
+        hashes[doc.id] = doc.content_hash or content_hash(doc.raw_json)
+        item = (doc.id, doc.raw_json)
+        db.expunge(doc)
+        yield item
+
+
+def convert_and_persist_batch(
+    db: Session,
+    plan: CompiledProfile,
+    batch_id: int,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    force: bool = False,
+) -> dict:
+    """
+    Convert the documents of a batch and write the results back, one bulk
+    UPDATE and commit per chunk. Documents already converted by this
+    profile version (up_to_date_filter) are skipped in SQL, without
+    loading their raw_json, unless force is set. Returns counts and
+    throughput.
+    """
+    started = time.perf_counter()
+    counts = {"total": 0, "skipped": 0}
+    converted = failed = 0
+    failed_ids: List[int] = []
+    # raw_json hashes of documents currently in flight, keyed by id
+    hashes: Dict[int, str] = {}
+    json_type_id = (
+        db.query(JSONBatch.json_type_id).filter(JSONBatch.id == batch_id).scalar()
+    )
+
+    # Rows are read on a separate session so the server-side cursor stays
+    # open while db issues UPDATEs and commits.
+    read_db = SessionLocal()
+    try:
+        documents = _iter_changed_documents(
+            read_db, batch_id, plan, chunk_size, hashes, counts, force
+        )
+        with ConversionExecutor(plan, workers=workers, chunk_size=chunk_size) as executor:
+            for chunk in executor.convert_chunks(documents):
+                persist_results(db, plan, chunk, hashes, json_type_id)
+                db.commit()
+
+                for result in chunk:
+                    hashes.pop(result["document_id"], None)
+                    if result["errors"]:
+                        failed += 1
+                        failed_ids.append(result["document_id"])
+                    else:
+                        converted += 1
+    finally:
+        read_db.close()
+
+    elapsed = time.perf_counter() - started
+    processed = converted + failed
+    return {
+        "batch_id": batch_id,
+        "profile_id": plan.profile_id,
+        "profile_version": plan.version,
+        "total": counts["total"],
+        "skipped": counts["skipped"],
+        "converted": converted,
+        "errors": failed,
+        "error_document_ids": failed_ids,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_second": round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,234 @@
+# app/utils/document_ingest.py
+
+import enum
+import time
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.json_batch import JSONBatch
+from app.models.json_documents import JSONDocument, DocumentStatus
+from app.schemas.json_batch import JSONBatchCreate, JSONBatchOut
+from app.utils.content_hash import content_hash
+from app.utils.json_compression import storage_values
+
+
+def create_batch(db: Session, batch_data: JSONBatchCreate) -> JSONBatchOut:
+    """Create and commit the batch row documents are streamed into."""
+    batch = JSONBatch(
+        name=batch_data.name,
+        json_type_id=batch_data.json_type_id,
+        category_id=batch_data.category_id,
+        source=batch_data.source,
+        uploaded_by=batch_data.uploaded_by,
+        notes=batch_data.notes,
+    )
+    db.add(batch)
+    db.commit()
+    db.refresh(batch)
+    return JSONBatchOut.from_orm(batch)
+
+
+def document_row(
+    batch: JSONBatchOut,
+    raw_json: Any,
+    name: Optional[str] = None,
+    category_id: Optional[int] = None,
+) -> dict:
+    return {
+        "batch_id": batch.id,
+        "json_type_id": batch.json_type_id,
+        "category_id": category_id or batch.category_id,
+        "name": name,
+        "raw_json": raw_json,
+        "status": DocumentStatus.RAW,
+    }
+
+
+class DuplicateMode(str, enum.Enum):
+    """What to do with uploaded documents whose raw_json already exists in the json_type."""
+    ALLOW = "allow"  # store them like any other document
+    SKIP = "skip"    # don't store them
+    LINK = "link"    # don't store them; report the existing document's id in their place
+    FLAG = "flag"    # store them with duplicate_of_id pointing at the existing document
+
+
+class IngestedDocument(NamedTuple):
+    """Outcome for one uploaded document."""
+    # New document id, or for LINK the existing one; None when skipped
+    id: Optional[int]
+    # None unless a row was inserted
+    created_at: Optional[datetime]
+    duplicate_of_id: Optional[int] = None
+
+
+class DocumentInserter:
+    """
+    Inserts the documents of one batch chunk by chunk: one multi-row
+    INSERT per chunk, then one SELECT for the generated ids and
+    created_at, instead of an INSERT and a refresh per document.
+
+    Ids are read back as the batch's rows above the last id seen, in id
+    order, which matches row order within a multi-row INSERT. That relies
+    only on this inserter being the one writing the (new) batch, not on
+    auto-increment values being consecutive.
+
+    Every row gets its content_hash. Unless duplicates is ALLOW, the
+    hashes of a chunk are looked up in one query against existing
+    documents of the json_type (including earlier chunks of this upload),
+    and repeats within the chunk are caught in memory.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        batch_id: int,
+        json_type_id: int,
+        commit_chunks: bool = False,
+        duplicates: DuplicateMode = DuplicateMode.ALLOW,
+    ):
+        self.db = db
+        self.batch_id = batch_id
+        self.json_type_id = json_type_id
+        self.commit_chunks = commit_chunks
+        self.duplicates = duplicates
+        self.last_id = 0
+        self.inserted = 0
+        self.duplicate_count = 0
+        self.insert_seconds = 0.0
+
+    def insert(self, rows: List[dict]) -> List[IngestedDocument]:
+        """Insert rows; returns one IngestedDocument per row, in order."""
+        if not rows:
+            return []
+        started = time.perf_counter()
+
+        for row in rows:
+            row["content_hash"] = content_hash(row["raw_json"])
+
+        if self.duplicates == DuplicateMode.ALLOW:
+            results = [IngestedDocument(*key) for key in self._insert_rows(rows)]
+        else:
+            results = self._insert_deduplicated(rows)
+
+        if self.commit_chunks:
+            self.db.commit()
+        self.insert_seconds += time.perf_counter() - started
+        return results
+
+    def _insert_deduplicated(self, rows: List[dict]) -> List[IngestedDocument]:
+        existing = self._existing_ids({row["content_hash"] for row in rows})
+
+        # Per row: the index of the row it repeats (within this chunk) or
+        # the id of the document it repeats (already stored).
+        first_seen: Dict[str, int] = {}
+        new_rows: List[int] = []
+        repeats: Dict[int, Tuple[str, int]] = {}
+        for i, row in enumerate(rows):
+            h = row["content_hash"]
+            if h in existing:
+                repeats[i] = ("id", existing[h])
+            elif h in first_seen:
+                repeats[i] = ("row", first_seen[h])
+            else:
+                first_seen[h] = i
+                new_rows.append(i)
+
+        # FLAG stores repeats too, in upload order along with the new rows,
+        # so ids follow the upload. Repeats of a stored document get
+        # duplicate_of_id up front; repeats of a row in this chunk are
+        # pointed at it once its id is known.
+        stored = new_rows
+        if self.duplicates == DuplicateMode.FLAG:
+            for i, (kind, ref) in repeats.items():
+                if kind == "id":
+                    rows[i]["duplicate_of_id"] = ref
+            stored = sorted(new_rows + list(repeats))
+
+        results: List[Optional[IngestedDocument]] = [None] * len(rows)
+        for i, key in zip(stored, self._insert_rows([rows[i] for i in stored])):
+            results[i] = IngestedDocument(*key)
+
+        links: List[dict] = []
+        for i, (kind, ref) in repeats.items():
+            original_id = ref if kind == "id" else results[ref].id
+            self.duplicate_count += 1
+            if self.duplicates == DuplicateMode.SKIP:
+                results[i] = IngestedDocument(None, None, original_id)
+            elif self.duplicates == DuplicateMode.LINK:
+                results[i] = IngestedDocument(original_id, None, original_id)
+            else:
+                results[i] = results[i]._replace(duplicate_of_id=original_id)
+                if kind == "row":
+                    links.append({"doc_id": results[i].id, "original_id": original_id})
+
+        if links:
+            table = JSONDocument.__table__
+            self.db.execute(
+                update(table)
+                .where(table.c.id == bindparam("doc_id"))
+                .values(duplicate_of_id=bindparam("original_id")),
+                links,
+            )
+        return results
+
+    def _existing_ids(self, hashes: Set[str]) -> Dict[str, int]:
+        """content_hash -> id of the first stored, non-duplicate document with it."""
+        found = self.db.execute(
+            select(JSONDocument.content_hash, func.min(JSONDocument.id))
+            .where(
+                JSONDocument.json_type_id == self.json_type_id,
+                JSONDocument.content_hash.in_(hashes),
+                JSONDocument.duplicate_of_id.is_(None),
+            )
+            .group_by(JSONDocument.content_hash)
+        ).all()
+        return {h: doc_id for h, doc_id in found}
+
+    def _insert_rows(self, rows: List[dict]) -> List[Tuple[int, datetime]]:
+        if not rows:
+            return []
+        self.db.execute(
+            insert(JSONDocument.__table__).values([self._storage_row(row) for row in rows])
+        )
+        keys = self.db.execute(
+            select(JSONDocument.id, JSONDocument.created_at)
+            .where(JSONDocument.batch_id == self.batch_id, JSONDocument.id > self.last_id)
+            .order_by(JSONDocument.id.asc())
+            .limit(len(rows))
+        ).all()
+        if len(keys) != len(rows):
+            raise RuntimeError(
+                f"Inserted {len(rows)} documents into batch {self.batch_id} "
+                f"but read back {len(keys)}"
+            )
+        self.last_id = keys[-1][0]
+        self.inserted += len(rows)
+        return [(doc_id, created_at) for doc_id, created_at in keys]
+
+    def _storage_row(self, row: dict) -> dict:
+        values = dict(row)
+        # Multi-row VALUES need the same columns in every row.
+        values.setdefault("duplicate_of_id", None)
+        values["raw_json"], values["raw_json_packed"] = storage_values(
+            row["raw_json"], self.json_type_id
+        )
+        return values
+
+    @property
+    def docs_per_second(self) -> Optional[float]:
+        if self.insert_seconds <= 0:
+            return None
+        return round(self.inserted / self.insert_seconds, 1)
+
+
+def discard_batch(db: Session, batch_id: int):
+    """Remove a partially ingested batch and its documents."""
+    db.rollback()
+    db.query(JSONDocument).filter(JSONDocument.batch_id == batch_id).delete(
+        synchronize_session=False
+    )
+    db.query(JSONBatch).filter(JSONBatch.id == batch_id).delete(synchronize_session=False)
+    db.commit()
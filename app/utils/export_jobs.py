@@ -0,0 +1,365 @@
+# app/utils/export_jobs.py
+"""
+Background batch export jobs.
+
+Jobs are rows in export_job. Worker processes poll for PENDING jobs,
+claim one with a conditional UPDATE (so several workers, even across
+app processes, never run the same job), render the batch into a ZIP
+under EXPORT_JOB_DIR and record progress as they go. Finished archives
+and job rows survive restarts; a job left RUNNING by a dead worker is
+re-queued once its heartbeat (written every EXPORT_JOB_HEARTBEAT_SECONDS
+by a timer, not per document) is older than EXPORT_JOB_STALE_SECONDS, and
+re-running it is cheap because already-rendered documents come from the
+artifact cache. Every claim writes to its own file and only records it
+if it still owns the job, so a worker that was wrongly presumed dead
+cannot clobber the new owner's archive.
+
+Workers are started with the API (EXPORT_JOB_WORKERS) or standalone:
+
+    python -m app.utils.export_jobs --workers 4
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.connection import SessionLocal
+from app.models.export_job import ExportJob, ExportJobStatus
+from app.models.export_template import ExportFormat
+from app.models.json_documents import JSONDocument
+from app.utils.export_service import iter_batch_exports
+from app.utils.zip_stream import iter_zip
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------
+# Submitting and inspecting jobs
+# ---------------------------------------------------------
+
+def submit_export_job(
+    db: Session,
+    batch_id: int,
+    export_format: ExportFormat,
+    with_answers: bool,
+    template_id: Optional[int] = None,
+) -> ExportJob:
+    total = db.query(JSONDocument.id).filter(JSONDocument.batch_id == batch_id).count()
+    job = ExportJob(
+        batch_id=batch_id,
+        format=export_format,
+        with_answers=with_answers,
+        template_id=template_id,
+        status=ExportJobStatus.PENDING,
+        total_documents=total,
+        done_documents=0,
+        failed_documents=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def job_rates(job: ExportJob) -> Tuple[Optional[float], Optional[float]]:
+    """(docs_per_second, eta_seconds) for a job, where they can be known."""
+    if not job.started_at:
+        return None, None
+    end = job.finished_at or datetime.utcnow()
+    elapsed = (end - job.started_at).total_seconds()
+    processed = job.done_documents + job.failed_documents
+    if elapsed <= 0 or processed == 0:
+        return None, None
+    rate = processed / elapsed
+    if job.status != ExportJobStatus.RUNNING:
+        return round(rate, 2), None
+    remaining = max(0, job.total_documents - processed)
+    return round(rate, 2), round(remaining / rate, 1)
+
+
+def job_archive_path(job_id: int, claim_tag: str) -> str:
+    """Archive path for one claim of a job; result_path records the winner."""
+    return os.path.join(settings.EXPORT_JOB_DIR, f"export_job_{job_id}_{claim_tag}.zip")
+
+
+# ---------------------------------------------------------
+# Claiming and running jobs
+# ---------------------------------------------------------
+
+def requeue_stale_jobs(db: Session) -> int:
+    """Put RUNNING jobs whose worker stopped heart-beating back in the queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.EXPORT_JOB_STALE_SECONDS)
+    count = (
+        db.query(ExportJob)
+        .filter(
+            ExportJob.status == ExportJobStatus.RUNNING,
+            ExportJob.heartbeat_at < cutoff,
+        )
+        .update(
+            {ExportJob.status: ExportJobStatus.PENDING, ExportJob.worker: None},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return count
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[Tuple[int, str]]:
+    """
+    Atomically claim the oldest PENDING job; returns (job id, claim) or
+    None. The claim is stored in ExportJob.worker and is unique per
+    claim, so a worker whose job was re-queued and claimed again can tell
+    it no longer owns it.
+    """
+    candidates = (
+        db.query(ExportJob.id)
+        .filter(ExportJob.status == ExportJobStatus.PENDING)
+        .order_by(ExportJob.id.asc())
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        now = datetime.utcnow()
+        claim = f"{worker_id[:80]}#{uuid.uuid4().hex[:12]}"
+        claimed = (
+            db.query(ExportJob)
+            .filter(ExportJob.id == job_id, ExportJob.status == ExportJobStatus.PENDING)
+            .update(
+                {
+                    ExportJob.status: ExportJobStatus.RUNNING,
+                    ExportJob.worker: claim,
+                    ExportJob.started_at: now,
+                    ExportJob.heartbeat_at: now,
+                    ExportJob.done_documents: 0,
+                    ExportJob.failed_documents: 0,
+                    ExportJob.error: None,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed == 1:
+            return job_id, claim
+    return None
+
+
+def _update_claimed_job(db: Session, job_id: int, claim: str, values: dict) -> bool:
+    """Update a job only while this claim still owns it; False if it doesn't."""
+    updated = (
+        db.query(ExportJob)
+        .filter(
+            ExportJob.id == job_id,
+            ExportJob.worker == claim,
+            ExportJob.status == ExportJobStatus.RUNNING,
+        )
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+    return updated == 1
+
+
+class ClaimLost(Exception):
+    """The job was re-queued (or otherwise taken) while this worker ran it."""
+
+
+class _Heartbeat(threading.Thread):
+    """
+    Writes heartbeat_at and progress counts every
+    EXPORT_JOB_HEARTBEAT_SECONDS on its own session, however long single
+    documents take to render, and notices when the claim was lost.
+    """
+
+    def __init__(self, job_id: int, claim: str, progress: dict):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.claim = claim
+        self.progress = progress
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(settings.EXPORT_JOB_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                owned = _update_claimed_job(db, self.job_id, self.claim, {
+                    ExportJob.done_documents: self.progress["done"],
+                    ExportJob.failed_documents: self.progress["failed"],
+                    ExportJob.heartbeat_at: datetime.utcnow(),
+                })
+            except Exception:
+                # Keep trying; the job only goes stale after
+                # EXPORT_JOB_STALE_SECONDS without a beat.
+                logger.exception("Export job %s heartbeat failed", self.job_id)
+                continue
+            finally:
+                db.close()
+            if not owned:
+                self.lost = True
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_export_job(db: Session, job_id: int, claim: str):
+    """Render a claimed job's batch into its archive, recording progress."""
+    job = db.query(ExportJob).get(job_id)
+    batch_id = job.batch_id
+    export_format = job.format
+    with_answers = job.with_answers
+    template_id = job.template_id
+
+    os.makedirs(settings.EXPORT_JOB_DIR, exist_ok=True)
+    # Paths are per claim: a worker that lost its claim never writes over
+    # the archive of the one that took the job over.
+    final_path = job_archive_path(job_id, claim.rsplit("#", 1)[-1])
+    part_path = final_path + ".part"
+
+    progress = {"done": 0, "failed": 0}
+    manifest = []
+    heartbeat = _Heartbeat(job_id, claim, progress)
+
+    def entries():
+        for item in iter_batch_exports(
+            db,
+            batch_id=batch_id,
+            export_format=export_format,
+            with_answers=with_answers,
+            template_id=template_id,
+            # Job workers are already one process each.
+            workers=1,
+        ):
+            if heartbeat.lost:
+                raise ClaimLost()
+            if "error" in item:
+                progress["failed"] += 1
+                manifest.append({"document_id": item["document_id"], "error": item["error"]})
+            else:
+                progress["done"] += 1
+                entry_name = f"{item['document_id']}_{item['file_name']}"
+                manifest.append({
+                    "document_id": item["document_id"],
+                    "file_name": entry_name,
+                    "size": len(item["data"]),
+                })
+                yield entry_name, item["data"]
+
+        yield "manifest.json", json.dumps({
+            "job_id": job_id,
+            "batch_id": batch_id,
+            "format": export_format.value,
+            "with_answers": with_answers,
+            "documents": manifest,
+        }, indent=2).encode("utf-8")
+
+    heartbeat.start()
+    try:
+        with open(part_path, "wb") as fh:
+            for chunk in iter_zip(entries()):
+                fh.write(chunk)
+        heartbeat.stop()
+        if heartbeat.lost:
+            raise ClaimLost()
+        os.replace(part_path, final_path)
+    except Exception as exc:
+        heartbeat.stop()
+        db.rollback()
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+        if isinstance(exc, ClaimLost):
+            logger.warning("Export job %s was taken over; abandoning claim %s", job_id, claim)
+            return
+        logger.exception("Export job %s failed", job_id)
+        _update_claimed_job(db, job_id, claim, {
+            ExportJob.status: ExportJobStatus.FAILED,
+            ExportJob.error: str(exc),
+            ExportJob.done_documents: progress["done"],
+            ExportJob.failed_documents: progress["failed"],
+            ExportJob.finished_at: datetime.utcnow(),
+        })
+        return
+
+    finished = _update_claimed_job(db, job_id, claim, {
+        ExportJob.status: ExportJobStatus.DONE,
+        ExportJob.result_path: final_path,
+        ExportJob.done_documents: progress["done"],
+        ExportJob.failed_documents: progress["failed"],
+        ExportJob.total_documents: progress["done"] + progress["failed"],
+        ExportJob.finished_at: datetime.utcnow(),
+    })
+    if not finished:
+        # Lost the claim after rendering; the new owner's archive counts.
+        logger.warning("Export job %s was taken over; discarding %s", job_id, final_path)
+        os.unlink(final_path)
+
+
+# ---------------------------------------------------------
+# Worker processes
+# ---------------------------------------------------------
+
+def worker_loop(stop_event=None):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    while stop_event is None or not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+            claimed = claim_next_job(db, worker_id)
+            if claimed is not None:
+                run_export_job(db, *claimed)
+                continue
+        except Exception:
+            logger.exception("Export job worker %s error", worker_id)
+        finally:
+            db.close()
+
+        if stop_event is not None:
+            stop_event.wait(settings.EXPORT_JOB_POLL_SECONDS)
+        else:
+            time.sleep(settings.EXPORT_JOB_POLL_SECONDS)
+
+
+def start_workers(count: Optional[int] = None):
+    """Start job worker processes; returns (processes, stop_event)."""
+    count = settings.EXPORT_JOB_WORKERS if count is None else count
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes: List = []
+    for _ in range(count):
+        proc = ctx.Process(target=worker_loop, args=(stop_event,), daemon=True)
+        proc.start()
+        processes.append(proc)
+    return processes, stop_event
+
+
+def stop_workers(processes: List, stop_event, timeout: float = 10.0):
+    stop_event.set()
+    for proc in processes:
+        proc.join(timeout)
+        if proc.is_alive():
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background export job workers.")
+    parser.add_argument("--workers", type=int, default=max(1, settings.EXPORT_JOB_WORKERS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    procs, stop = start_workers(args.workers)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        stop_workers(procs, stop)
@@ -2,22 +2,38 @@
 
 import base64
 import io
+import tempfile
+import threading
 from datetime import datetime
-from typing import List, Tuple, Any, Optional
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Tuple, Any, Optional
 
 from sqlalchemy.orm import Session
-from docx import Document  # pip install python-docx
 from reportlab.pdfgen import canvas  # pip install reportlab
 
-from app.models.json_document import JSONDocument
+from app.models.json_documents import JSONDocument
 from app.models.export_template import ExportTemplate, ExportFormat
 from app.models.field_config import FieldConfigSet, FieldConfig, ExportMaskType
-from app.utils.mapping_engine import json_get
+from app.utils.artifact_cache import ArtifactCache, get_artifact_cache
+from app.utils.content_hash import content_hash
+from app.utils.mapping_engine import MISSING, PathExtractor
+from app.utils.render_executor import RenderExecutor
+from app.utils.template_cache import (
+    apply_pdf_template,
+    get_template_cache,
+    resolve_template_path,
+    template_stamp,
+)
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.DOCX: "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ExportFormat.PDF: "application/pdf",
+}
 
 
 def _pick_template(
     db: Session,
-    document: JSONDocument,
+    json_type_id: int,
     export_format: ExportFormat,
     with_answers: bool,
     template_id: Optional[int],
@@ -31,7 +47,7 @@ def _pick_template(
     t = (
         db.query(ExportTemplate)
         .filter(
-            ExportTemplate.json_type_id == document.json_type_id,
+            ExportTemplate.json_type_id == json_type_id,
             ExportTemplate.format == export_format,
             ExportTemplate.with_answers == with_answers,
             ExportTemplate.is_active == True,
@@ -65,19 +81,80 @@ def _pick_field_config_set(db: Session, json_type_id: int) -> Optional[FieldConf
     )
 
 
-def _build_field_values(
-    db: Session,
-    document: JSONDocument,
-    with_answers: bool,
-) -> List[Tuple[str, str]]:
+# ---------------------------------------------------------
+# Field extraction plans
+# ---------------------------------------------------------
+
+class ExportField(NamedTuple):
+    label: str
+    json_path: str
+    mask_type: ExportMaskType
+
+
+# Masked fields render as a constant instead of their value
+_MASK_VALUES = {
+    ExportMaskType.HIDE_VALUE: "",
+    ExportMaskType.REDACT: "***",
+}
+
+
+class FieldPlan:
     """
-    Returns list of (label, value_str) according to field_config.
-    If with_answers is False, values are blanked.
+    A field config set compiled for export: labels in order, masks
+    resolved to constant values up front, and every unmasked path pulled
+    out of a document in a single PathExtractor traversal (shared
+    prefixes are walked once). Masked fields are never read at all.
     """
-    cfg_set = _pick_field_config_set(db, document.json_type_id)
-    if not cfg_set:
-        # Fallback: single block dumping the JSON.
-        return [("JSON", _safe_stringify(document.raw_json if with_answers else {}))]
+
+    def __init__(self, config_set_id: int, version: int, fields: List[ExportField]):
+        self.config_set_id = config_set_id
+        self.version = version
+        self.fields: Tuple[ExportField, ...] = tuple(fields)
+        self.labels: Tuple[str, ...] = tuple(f.label for f in self.fields)
+
+        # Per field: the constant value for masked fields, None otherwise
+        self._constants: Tuple[Optional[str], ...] = tuple(
+            _MASK_VALUES.get(f.mask_type) for f in self.fields
+        )
+        paths = [
+            f.json_path for f, const in zip(self.fields, self._constants) if const is None
+        ]
+        self.extractor: Optional[PathExtractor] = PathExtractor(paths) if paths else None
+        self._slots: Tuple[int, ...] = tuple(
+            self.extractor.slot(f.json_path) if const is None else -1
+            for f, const in zip(self.fields, self._constants)
+        )
+
+    def rows(self, raw_json: Any, with_answers: bool) -> List[Tuple[str, str]]:
+        """(label, value_str) per field; values are blanked without answers."""
+        if not with_answers:
+            return [(label, "") for label in self.labels]
+
+        values = self.extractor.extract(raw_json) if self.extractor else ()
+        rows: List[Tuple[str, str]] = []
+        for label, const, slot in zip(self.labels, self._constants, self._slots):
+            if const is not None:
+                rows.append((label, const))
+                continue
+            value = values[slot]
+            rows.append((label, _safe_stringify(None if value is MISSING else value)))
+        return rows
+
+
+_field_plan_cache: Dict[int, FieldPlan] = {}
+_field_plan_cache_lock = threading.Lock()
+
+
+def get_field_plan(db: Session, cfg_set: FieldConfigSet) -> FieldPlan:
+    """
+    Return the compiled plan for a config set, loading its field configs
+    only on first use and whenever the set's version has moved on.
+    """
+    version = cfg_set.version or 0
+    with _field_plan_cache_lock:
+        plan = _field_plan_cache.get(cfg_set.id)
+    if plan is not None and plan.version == version:
+        return plan
 
     configs: List[FieldConfig] = (
         db.query(FieldConfig)
@@ -88,28 +165,107 @@ def _build_field_values(
         .order_by(FieldConfig.order_index.asc())
         .all()
     )
+    plan = FieldPlan(
+        config_set_id=cfg_set.id,
+        version=version,
+        fields=[
+            ExportField(
+                label=cfg.label or cfg.json_path,
+                json_path=cfg.json_path,
+                mask_type=cfg.export_mask_type,
+            )
+            for cfg in configs
+        ],
+    )
+    with _field_plan_cache_lock:
+        _field_plan_cache[cfg_set.id] = plan
+    return plan
 
-    rows: List[Tuple[str, str]] = []
-    for cfg in configs:
-        label = cfg.label or cfg.json_path
 
-        if not with_answers:
-            val_str = ""
-        else:
-            raw_val = json_get(document.raw_json, cfg.json_path)
-            val_str = _apply_mask_and_stringify(raw_val, cfg.export_mask_type)
+def invalidate_field_plan(config_set_id: int):
+    with _field_plan_cache_lock:
+        _field_plan_cache.pop(config_set_id, None)
 
-        rows.append((label, val_str))
 
-    return rows
+# ---------------------------------------------------------
+# Export context
+# ---------------------------------------------------------
 
+class ExportContext(NamedTuple):
+    """
+    Template and field configuration resolved for one
+    (json_type_id, format, with_answers, template_id) combination.
+    Holds plain values only, so it outlives the session it came from.
+    """
+    template_id: int
+    template_version: int
+    template_name: str
+    # Resolved template file, None when template_path has no file behind it
+    template_path: Optional[str]
+    template_stamp: str
+    config_set_id: Optional[int]
+    config_set_version: Optional[int]
+    # None when the json_type has no field config set (dump the JSON).
+    field_plan: Optional[FieldPlan]
+
+
+def resolve_export_context(
+    db: Session,
+    json_type_id: int,
+    export_format: ExportFormat,
+    with_answers: bool,
+    template_id: Optional[int] = None,
+    cache: Optional[Dict[tuple, ExportContext]] = None,
+) -> ExportContext:
+    """
+    Look up the template, config set and compiled field plan.
+    Pass the same cache dict for every document of a batch so the
+    lookups run once per json_type rather than once per document.
+    """
+    key = (json_type_id, export_format, with_answers, template_id)
+    if cache is not None and key in cache:
+        return cache[key]
 
-def _apply_mask_and_stringify(value: Any, mask_type: ExportMaskType) -> str:
-    if mask_type == ExportMaskType.HIDE_VALUE:
-        return ""
-    if mask_type == ExportMaskType.REDACT:
-        return "***"
-    return _safe_stringify(value)
+    template = _pick_template(
+        db=db,
+        json_type_id=json_type_id,
+        export_format=export_format,
+        with_answers=with_answers,
+        template_id=template_id,
+    )
+
+    cfg_set = _pick_field_config_set(db, json_type_id)
+    template_path = resolve_template_path(template.template_path)
+
+    context = ExportContext(
+        template_id=template.id,
+        template_version=template.version or 0,
+        template_name=template.name,
+        template_path=template_path,
+        template_stamp=template_stamp(template_path),
+        config_set_id=cfg_set.id if cfg_set else None,
+        config_set_version=(cfg_set.version or 0) if cfg_set else None,
+        field_plan=get_field_plan(db, cfg_set) if cfg_set else None,
+    )
+    if cache is not None:
+        cache[key] = context
+    return context
+
+
+def _build_field_values(
+    document: JSONDocument,
+    with_answers: bool,
+    context: ExportContext,
+) -> List[Tuple[str, str]]:
+    """
+    Returns list of (label, value_str) according to field_config.
+    If with_answers is False, values are blanked.
+    """
+    if context.field_plan is None:
+        # Fallback: single block dumping the JSON.
+        return [("JSON", _safe_stringify(document.raw_json if with_answers else {}))]
+
+    return context.field_plan.rows(document.raw_json, with_answers)
 
 
 def _safe_stringify(value: Any) -> str:
@@ -129,14 +285,13 @@ def json_dumps_compact(value: Any) -> str:
     return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
 
 
-def _create_docx(
-    fields: List[Tuple[str, str]],
-    doc_title: str,
-) -> bytes:
-    doc = Document()
-    if doc_title:
-        doc.add_heading(doc_title, level=1)
+PDF_TOP = 800
+PDF_BOTTOM = 50
+PDF_LEFT = 50
+PDF_LINE_HEIGHT = 20
+
 
+def _add_docx_fields(doc, fields: List[Tuple[str, str]]):
     for label, value in fields:
         p = doc.add_paragraph()
         run_label = p.add_run(f"{label}: ")
@@ -144,41 +299,158 @@ def _create_docx(
         if value:
             p.add_run(str(value))
 
+
+def _create_docx(
+    fields: List[Tuple[str, str]],
+    doc_title: str,
+    template_path: Optional[str] = None,
+) -> bytes:
+    doc = get_template_cache().docx(template_path)
+    if doc_title:
+        doc.add_heading(doc_title, level=1)
+
+    _add_docx_fields(doc, fields)
+
     buffer = io.BytesIO()
     doc.save(buffer)
     buffer.seek(0)
     return buffer.getvalue()
 
 
+def _draw_pdf_title(c: canvas.Canvas, y: int, doc_title: str) -> int:
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(PDF_LEFT, y, doc_title)
+    return y - 30
+
+
+def _draw_pdf_fields(c: canvas.Canvas, y: int, fields: List[Tuple[str, str]]) -> int:
+    """Draw field rows from y down, starting new pages as needed; returns the new y."""
+    c.setFont("Helvetica", 10)
+
+    for label, value in fields:
+        line = f"{label}: {value}" if value else f"{label}:"
+        if y < PDF_BOTTOM:
+            c.showPage()
+            y = PDF_TOP
+            c.setFont("Helvetica", 10)
+        c.drawString(PDF_LEFT, y, line)
+        y -= PDF_LINE_HEIGHT
+
+    return y
+
+
 def _create_pdf(
     fields: List[Tuple[str, str]],
     doc_title: str,
+    template_path: Optional[str] = None,
 ) -> bytes:
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer)
 
-    y = 800
+    y = PDF_TOP
 
     if doc_title:
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, y, doc_title)
-        y -= 30
+        y = _draw_pdf_title(c, y, doc_title)
 
-    c.setFont("Helvetica", 10)
-
-    for label, value in fields:
-        line = f"{label}: {value}" if value else f"{label}:"
-        if y < 50:
-            c.showPage()
-            y = 800
-            c.setFont("Helvetica", 10)
-        c.drawString(50, y, line)
-        y -= 20
+    _draw_pdf_fields(c, y, fields)
 
     c.showPage()
     c.save()
-    buffer.seek(0)
-    return buffer.getvalue()
+    return apply_pdf_template(buffer.getvalue(), template_path)
+
+
+class RenderJob(NamedTuple):
+    """Everything needed to render one file; picklable for render workers."""
+    export_format: ExportFormat
+    fields: List[Tuple[str, str]]
+    title: str
+    file_name: str
+    # Artifact cache key, or None when the cache is disabled
+    cache_key: Optional[str] = None
+    template_path: Optional[str] = None
+
+
+def prepare_export(
+    document: JSONDocument,
+    export_format: ExportFormat,
+    with_answers: bool,
+    context: ExportContext,
+) -> RenderJob:
+    """Extract field rows for a document; rendering happens separately."""
+    if export_format not in (ExportFormat.DOCX, ExportFormat.PDF):
+        raise ValueError("Unsupported export format")
+
+    fields = _build_field_values(document, with_answers, context)
+
+    title = context.template_name or "Export"
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    extension = "docx" if export_format == ExportFormat.DOCX else "pdf"
+
+    cache_key = None
+    if get_artifact_cache() is not None:
+        cache_key = ArtifactCache.make_key(
+            # Stored at ingest; only documents from before that are hashed here.
+            content_hash=document.content_hash or content_hash(document.raw_json),
+            template_id=context.template_id,
+            template_version=context.template_version,
+            template_stamp=context.template_stamp,
+            config_set_id=context.config_set_id,
+            config_set_version=context.config_set_version,
+            export_format=export_format.value,
+            with_answers=with_answers,
+        )
+
+    return RenderJob(
+        export_format=export_format,
+        fields=fields,
+        title=title,
+        file_name=f"{title}_{timestamp}.{extension}",
+        cache_key=cache_key,
+        template_path=context.template_path,
+    )
+
+
+def render_job(job: RenderJob) -> bytes:
+    """Render prepared field rows to DOCX/PDF bytes."""
+    if job.export_format == ExportFormat.DOCX:
+        return _create_docx(job.fields, job.title, job.template_path)
+    if job.export_format == ExportFormat.PDF:
+        return _create_pdf(job.fields, job.title, job.template_path)
+    raise ValueError("Unsupported export format")
+
+
+def render_export(
+    db: Session,
+    document: JSONDocument,
+    export_format: ExportFormat,
+    with_answers: bool,
+    template_id: Optional[int] = None,
+    context: Optional[ExportContext] = None,
+) -> tuple[bytes, str]:
+    """
+    Returns (raw_bytes, file_name)
+    """
+    if context is None:
+        context = resolve_export_context(
+            db=db,
+            json_type_id=document.json_type_id,
+            export_format=export_format,
+            with_answers=with_answers,
+            template_id=template_id,
+        )
+
+    job = prepare_export(document, export_format, with_answers, context)
+
+    cache = get_artifact_cache()
+    if cache is not None and job.cache_key:
+        cached = cache.get(job.cache_key)
+        if cached is not None:
+            return cached, job.file_name
+
+    raw_bytes = render_job(job)
+    if cache is not None and job.cache_key:
+        cache.put(job.cache_key, raw_bytes)
+    return raw_bytes, job.file_name
 
 
 def generate_export(
@@ -187,31 +459,219 @@ def generate_export(
     export_format: ExportFormat,
     with_answers: bool,
     template_id: Optional[int] = None,
+    context: Optional[ExportContext] = None,
 ) -> tuple[str, str]:
     """
     Returns (file_data_base64, file_name)
     """
-    template = _pick_template(
+    raw_bytes, file_name = render_export(
         db=db,
         document=document,
         export_format=export_format,
         with_answers=with_answers,
         template_id=template_id,
+        context=context,
     )
+    encoded = base64.b64encode(raw_bytes).decode("utf-8")
+    return encoded, file_name
 
-    fields = _build_field_values(db, document, with_answers)
 
-    title = template.name or "Export"
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-
-    if export_format == ExportFormat.DOCX:
-        raw_bytes = _create_docx(fields, title)
-        file_name = f"{title}_{timestamp}.docx"
-    elif export_format == ExportFormat.PDF:
-        raw_bytes = _create_pdf(fields, title)
-        file_name = f"{title}_{timestamp}.pdf"
-    else:
+def iter_batch_exports(
+    db: Session,
+    batch_id: int,
+    export_format: ExportFormat,
+    with_answers: bool,
+    template_id: Optional[int] = None,
+    chunk_size: int = 100,
+    workers: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Render every document of a batch, yielding results in id order.
+    Yields {"document_id", "file_name", "data"} or, when a document
+    fails, {"document_id", "error"}.
+
+    Documents are read chunk_size at a time (keyset pagination, so
+    template/config lookups can share the session) and expunged once
+    their field rows are extracted. Template and field configs are
+    resolved once per json_type for the whole batch. Field rows are
+    extracted here and rendered across EXPORT_RENDER_WORKERS processes;
+    documents already in the artifact cache skip rendering.
+    """
+    contexts: Dict[tuple, ExportContext] = {}
+    cache = get_artifact_cache()
+
+    def jobs():
+        for doc in _iter_batch_documents(db, batch_id, chunk_size):
+            try:
+                context = resolve_export_context(
+                    db=db,
+                    json_type_id=doc.json_type_id,
+                    export_format=export_format,
+                    with_answers=with_answers,
+                    template_id=template_id,
+                    cache=contexts,
+                )
+                job = prepare_export(doc, export_format, with_answers, context)
+            except ValueError as exc:
+                job = exc
+            document_id = doc.id
+            db.expunge(doc)
+
+            if isinstance(job, RenderJob) and cache is not None and job.cache_key:
+                cached = cache.get(job.cache_key)
+                if cached is not None:
+                    # Rendered bytes pass through the executor untouched.
+                    yield (document_id, job), cached
+                    continue
+            yield (document_id, job), job
+
+    with RenderExecutor(render_job, workers=workers) as executor:
+        for (document_id, job), submitted, result in executor.render(jobs()):
+            if isinstance(result, Exception):
+                yield {"document_id": document_id, "error": str(result)}
+                continue
+
+            if cache is not None and job.cache_key and submitted is job:
+                cache.put(job.cache_key, result)
+            yield {"document_id": document_id, "file_name": job.file_name, "data": result}
+
+
+def _iter_batch_documents(db: Session, batch_id: int, chunk_size: int) -> Iterator[JSONDocument]:
+    last_id = 0
+    while True:
+        chunk = (
+            db.query(JSONDocument)
+            .filter(JSONDocument.batch_id == batch_id, JSONDocument.id > last_id)
+            .order_by(JSONDocument.id.asc())
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        yield from chunk
+
+
+# ---------------------------------------------------------
+# Merged batch export
+# ---------------------------------------------------------
+
+class _MergedPdfWriter:
+    """Draws every document onto one canvas; pages are closed as they fill."""
+
+    def __init__(self, out: BinaryIO, doc_title: str, template_path: Optional[str] = None):
+        self.out = out
+        self.background = get_template_cache().pdf_background(template_path)
+        # With a template the pages are drawn to a scratch file first and
+        # merged over the template background on close.
+        self.target = tempfile.TemporaryFile() if self.background is not None else out
+        self.canvas = canvas.Canvas(self.target)
+        self.y = PDF_TOP
+        if doc_title:
+            self.y = _draw_pdf_title(self.canvas, self.y, doc_title)
+
+    def add(self, fields: List[Tuple[str, str]], new_page: bool):
+        if new_page:
+            self.canvas.showPage()
+            self.y = PDF_TOP
+        self.y = _draw_pdf_fields(self.canvas, self.y, fields)
+        # Blank line between documents
+        self.y -= PDF_LINE_HEIGHT
+
+    def close(self):
+        self.canvas.showPage()
+        self.canvas.save()
+        if self.background is not None:
+            self.target.seek(0)
+            get_template_cache().overlay_pdf(self.target, self.background, self.out)
+            self.target.close()
+
+
+class _MergedDocxWriter:
+    """Appends every document to one DOCX body."""
+
+    def __init__(self, out: BinaryIO, doc_title: str, template_path: Optional[str] = None):
+        self.out = out
+        self.doc = get_template_cache().docx(template_path)
+        if doc_title:
+            self.doc.add_heading(doc_title, level=1)
+
+    def add(self, fields: List[Tuple[str, str]], new_page: bool):
+        if new_page:
+            self.doc.add_page_break()
+        _add_docx_fields(self.doc, fields)
+        self.doc.add_paragraph()
+
+    def close(self):
+        self.doc.save(self.out)
+
+
+def render_batch_merged(
+    db: Session,
+    batch_id: int,
+    export_format: ExportFormat,
+    with_answers: bool,
+    out: BinaryIO,
+    template_id: Optional[int] = None,
+    page_per_document: bool = False,
+    chunk_size: int = 100,
+) -> dict:
+    """
+    Render every document of a batch, in id order, into a single
+    DOCX/PDF written to out (e.g. a whole question paper for printing).
+
+    Documents are read chunk_size at a time and drawn straight onto one
+    canvas / document body as they arrive, so there is one font setup and
+    one output file per batch and no per-document buffers. The heading
+    and template file come from the template of the first document. Documents that cannot
+    be exported are left out and reported in the returned summary:
+    {"file_name", "documents", "errors": [{"document_id", "error"}]}.
+    """
+    if export_format not in (ExportFormat.DOCX, ExportFormat.PDF):
         raise ValueError("Unsupported export format")
 
-    encoded = base64.b64encode(raw_bytes).decode("utf-8")
-    return encoded, file_name
+    contexts: Dict[tuple, ExportContext] = {}
+    writer = None
+    title = "Export"
+    written = 0
+    errors: List[dict] = []
+
+    for doc in _iter_batch_documents(db, batch_id, chunk_size):
+        try:
+            context = resolve_export_context(
+                db=db,
+                json_type_id=doc.json_type_id,
+                export_format=export_format,
+                with_answers=with_answers,
+                template_id=template_id,
+                cache=contexts,
+            )
+            fields = _build_field_values(doc, with_answers, context)
+        except ValueError as exc:
+            errors.append({"document_id": doc.id, "error": str(exc)})
+            db.expunge(doc)
+            continue
+        db.expunge(doc)
+
+        if writer is None:
+            title = context.template_name or "Export"
+            if export_format == ExportFormat.DOCX:
+                writer = _MergedDocxWriter(out, title, context.template_path)
+            else:
+                writer = _MergedPdfWriter(out, title, context.template_path)
+
+        writer.add(fields, new_page=page_per_document and written > 0)
+        written += 1
+
+    if writer is None:
+        detail = errors[0]["error"] if errors else "batch is empty"
+        raise ValueError(f"No documents could be exported: {detail}")
+    writer.close()
+
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    extension = "docx" if export_format == ExportFormat.DOCX else "pdf"
+    return {
+        "file_name": f"{title}_batch_{batch_id}_{timestamp}.{extension}",
+        "documents": written,
+        "errors": errors,
+    }
@@ -0,0 +1,326 @@
+# app/utils/json_compression.py
+"""
+Compressed storage of document JSON (raw_json / normalized_json).
+
+With DOCUMENT_COMPRESSION set to "zlib" or "zstd", document bodies are
+written compressed to the *_packed blob columns instead of the JSON
+columns, using the newest CompressionDictionary of the document's
+json_type when there is one. Question banks repeat the same keys and
+boilerplate text in every document, so the shared dictionary is where
+most of the saving on small documents comes from.
+
+Packed values are self-describing (codec and dictionary id in a 6-byte
+header), so rows written under different settings, codecs and
+dictionaries are read side by side, and going back to "none" only stops
+compressing new writes. PackedJSON is the model attribute that hides
+the two columns behind one plain value.
+
+Dictionaries are trained and existing rows (re)compressed with
+`python -m app.utils.recompress_documents`.
+"""
+
+import json
+import re
+import struct
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard  # pip install zstandard (DOCUMENT_COMPRESSION=zstd)
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+from app.config import settings
+from app.models.compression_dictionary import CompressionDictionary
+
+NONE = "none"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# zlib only looks back this far, so a longer preset dictionary is wasted
+ZLIB_MAX_DICTIONARY = 32 * 1024
+
+_CODEC_IDS = {ZLIB: 1, ZSTD: 2}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+# format version, codec id, dictionary id (0 = none)
+_HEADER = struct.Struct(">BBI")
+_FORMAT = 1
+
+
+class CompressionError(ValueError):
+    pass
+
+
+def storage_codec(codec: Optional[str] = None) -> str:
+    """Validated codec name; defaults to DOCUMENT_COMPRESSION."""
+    codec = (codec or settings.DOCUMENT_COMPRESSION).lower()
+    if codec not in (NONE, ZLIB, ZSTD):
+        raise CompressionError(f"Unknown document compression '{codec}'")
+    if codec == ZSTD and zstandard is None:
+        raise CompressionError("zstd document compression needs the zstandard package")
+    return codec
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _with_session(fn):
+    # Dictionaries are read on their own short session: callers may be in
+    # the middle of streaming rows on theirs.
+    from app.db.connection import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------
+# Dictionaries
+# ---------------------------------------------------------
+
+class DictionaryRegistry:
+    """
+    Compression dictionaries by id, plus which one new writes use per
+    (json_type, codec).
+
+    Dictionary rows never change, so they are cached for good. The
+    current dictionary of a json_type is looked up once per process and
+    kept until refresh(); another process keeps writing with the previous
+    one until it restarts, which only costs ratio since every dictionary
+    stays readable.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, Tuple[str, bytes]] = {}
+        self._current: Dict[Tuple[int, str], Optional[int]] = {}
+        self._zstd: Dict[int, Any] = {}
+
+    def get(self, dictionary_id: int) -> Tuple[str, bytes]:
+        """(codec, data) of a dictionary."""
+        with self._lock:
+            entry = self._by_id.get(dictionary_id)
+        if entry is not None:
+            return entry
+
+        row = _with_session(lambda db: (
+            db.query(CompressionDictionary.codec, CompressionDictionary.data)
+            .filter(CompressionDictionary.id == dictionary_id)
+            .first()
+        ))
+        if row is None:
+            raise CompressionError(f"Compression dictionary {dictionary_id} not found")
+        entry = (row.codec, bytes(row.data))
+        with self._lock:
+            self._by_id[dictionary_id] = entry
+        return entry
+
+    def current(self, json_type_id: int, codec: str) -> Optional[int]:
+        """Id of the dictionary new documents of json_type_id are written with."""
+        key = (json_type_id, codec)
+        with self._lock:
+            if key in self._current:
+                return self._current[key]
+
+        row = _with_session(lambda db: (
+            db.query(CompressionDictionary.id)
+            .filter(
+                CompressionDictionary.json_type_id == json_type_id,
+                CompressionDictionary.codec == codec,
+            )
+            .order_by(CompressionDictionary.id.desc())
+            .first()
+        ))
+        dictionary_id = row[0] if row else None
+        with self._lock:
+            self._current[key] = dictionary_id
+        return dictionary_id
+
+    def zstd_dict(self, dictionary_id: int):
+        with self._lock:
+            prepared = self._zstd.get(dictionary_id)
+        if prepared is None:
+            prepared = zstandard.ZstdCompressionDict(self.get(dictionary_id)[1])
+            with self._lock:
+                self._zstd[dictionary_id] = prepared
+        return prepared
+
+    def refresh(self, json_type_id: Optional[int] = None):
+        """Forget current-dictionary lookups (for one json_type or all)."""
+        with self._lock:
+            for key in list(self._current):
+                if json_type_id is None or key[0] == json_type_id:
+                    del self._current[key]
+
+
+_registry = DictionaryRegistry()
+
+
+def get_dictionary_registry() -> DictionaryRegistry:
+    return _registry
+
+
+_STRING_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"\s*:?')
+
+
+def _build_zlib_dictionary(samples: List[bytes], size: int) -> bytes:
+    # zlib has no trainer: a preset dictionary is just text the compressor
+    # may refer back to. Use the JSON strings (keys with their colon, and
+    # values) that recur across documents, most valuable last because
+    # nearer matches encode shorter.
+    size = min(size, ZLIB_MAX_DICTIONARY)
+    counts: Counter = Counter()
+    for sample in samples:
+        counts.update(set(_STRING_TOKEN.findall(sample.decode("utf-8", "replace"))))
+
+    ranked = sorted(
+        ((count * len(token), token) for token, count in counts.items() if count > 1),
+        reverse=True,
+    )
+    chosen: List[bytes] = []
+    total = 0
+    for _, token in ranked:
+        data = token.encode("utf-8")
+        if total + len(data) > size:
+            continue
+        chosen.append(data)
+        total += len(data)
+    return b"".join(reversed(chosen))
+
+
+def build_dictionary(codec: str, documents: List[Any], size: Optional[int] = None) -> bytes:
+    """Dictionary for codec trained on sample documents (plain JSON values)."""
+    codec = storage_codec(codec)
+    size = size or settings.DOCUMENT_DICT_BYTES
+    samples = [_dumps(doc) for doc in documents if doc is not None]
+    if not samples:
+        raise CompressionError("No sample documents to build a dictionary from")
+
+    if codec == ZLIB:
+        data = _build_zlib_dictionary(samples, size)
+    elif codec == ZSTD:
+        try:
+            data = zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError as exc:
+            raise CompressionError(f"Could not train a zstd dictionary: {exc}") from exc
+    else:
+        raise CompressionError("Dictionaries need a codec other than 'none'")
+
+    if not data:
+        raise CompressionError("Sample documents have no content in common")
+    return data
+
+
+# ---------------------------------------------------------
+# Packing and unpacking
+# ---------------------------------------------------------
+
+def pack_json(value: Any, json_type_id: Optional[int] = None, codec: Optional[str] = None) -> bytes:
+    """Compress value with codec and json_type_id's current dictionary."""
+    codec = storage_codec(codec)
+    if codec == NONE:
+        raise CompressionError("Cannot pack with compression 'none'")
+
+    dictionary_id = _registry.current(json_type_id, codec) if json_type_id is not None else None
+    data = _dumps(value)
+    if codec == ZLIB:
+        if dictionary_id:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=_registry.get(dictionary_id)[1])
+            payload = compressor.compress(data) + compressor.flush()
+        else:
+            payload = zlib.compress(data, ZLIB_LEVEL)
+    else:
+        prepared = _registry.zstd_dict(dictionary_id) if dictionary_id else None
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=prepared).compress(data)
+
+    return _HEADER.pack(_FORMAT, _CODEC_IDS[codec], dictionary_id or 0) + payload
+
+
+def packed_info(packed: bytes) -> Tuple[str, Optional[int]]:
+    """(codec, dictionary id or None) a packed value was written with."""
+    if len(packed) < _HEADER.size:
+        raise CompressionError("Packed document is truncated")
+    fmt, codec_id, dictionary_id = _HEADER.unpack_from(packed)
+    if fmt != _FORMAT or codec_id not in _CODEC_NAMES:
+        raise CompressionError("Unrecognised packed document header")
+    return _CODEC_NAMES[codec_id], dictionary_id or None
+
+
+def unpack_json(packed: bytes) -> Any:
+    codec, dictionary_id = packed_info(packed)
+    payload = memoryview(packed)[_HEADER.size:]
+    if codec == ZLIB:
+        if dictionary_id:
+            decompressor = zlib.decompressobj(zdict=_registry.get(dictionary_id)[1])
+        else:
+            decompressor = zlib.decompressobj()
+        data = decompressor.decompress(payload) + decompressor.flush()
+    else:
+        if zstandard is None:
+            raise CompressionError("Document is zstd-compressed but zstandard is not installed")
+        prepared = _registry.zstd_dict(dictionary_id) if dictionary_id else None
+        data = zstandard.ZstdDecompressor(dict_data=prepared).decompress(payload)
+    return json.loads(data)
+
+
+def storage_values(
+    value: Any,
+    json_type_id: Optional[int] = None,
+    codec: Optional[str] = None,
+) -> Tuple[Any, Optional[bytes]]:
+    """(JSON column value, packed column value) to store value under codec."""
+    if value is None:
+        return None, None
+    if storage_codec(codec) == NONE:
+        return value, None
+    return None, pack_json(value, json_type_id, codec)
+
+
+def stored_size(plain: Any, packed: Optional[bytes]) -> int:
+    """Bytes a stored value takes: the packed length, or its compact JSON text."""
+    if packed is not None:
+        return len(packed)
+    return 0 if plain is None else len(_dumps(plain))
+
+
+class PackedJSON:
+    """
+    Model attribute over a JSON column and its compressed blob twin.
+
+    Reads return the document from whichever column is set, decoding a
+    loaded packed value once. Writes store according to
+    DOCUMENT_COMPRESSION with the instance's json_type dictionary (none
+    if json_type_id is not set yet; recompressing fixes that up later).
+    """
+
+    def __init__(self, plain_attr: str, packed_attr: str):
+        self.plain_attr = plain_attr
+        self.packed_attr = packed_attr
+        self._cache_key = f"_{plain_attr}_unpacked"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        packed = getattr(obj, self.packed_attr)
+        if packed is None:
+            return getattr(obj, self.plain_attr)
+
+        cached = obj.__dict__.get(self._cache_key)
+        if cached is not None and cached[0] is packed:
+            return cached[1]
+        value = unpack_json(packed)
+        obj.__dict__[self._cache_key] = (packed, value)
+        return value
+
+    def __set__(self, obj, value):
+        plain, packed = storage_values(value, getattr(obj, "json_type_id", None))
+        setattr(obj, self.plain_attr, plain)
+        setattr(obj, self.packed_attr, packed)
+        obj.__dict__.pop(self._cache_key, None)
@@ -0,0 +1,198 @@
+# app/utils/json_stream.py
+"""
+Incremental parsing of streamed JSON uploads.
+
+JSONStreamParser takes the request body in arbitrary byte chunks and
+returns each complete top-level document as soon as it has been read, so
+only the document currently being received is ever buffered. Two input
+shapes are accepted:
+
+    ndjson  one JSON document per line (blank lines are ignored)
+    array   a single top-level JSON array of documents
+
+    parser = JSONStreamParser("ndjson")
+    for chunk in chunks:
+        for document in parser.feed(chunk):
+            ...
+    for document in parser.close():
+        ...
+"""
+
+import codecs
+import json
+import re
+from typing import Any, List
+
+NDJSON = "ndjson"
+ARRAY = "array"
+
+_WS = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+# What may be left after the error position when a document is merely
+# cut off: part of a number, of a literal, or of a \uXXXX escape (pair).
+_NUMBER_CHARS = frozenset("-+.0123456789eE")
+_NUMBER_TAIL = re.compile(r"[-+.0-9eE]*\Z")
+_ESCAPE_TAIL = re.compile(r"u[0-9a-fA-F]{0,4}(\\(u[0-9a-fA-F]{0,3})?)?\Z")
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+
+
+def _may_continue(exc: json.JSONDecodeError) -> bool:
+    """Whether a decode error at the end of the buffer could be fixed by more input."""
+    if exc.msg.startswith("Unterminated string"):
+        return True
+    tail = exc.doc[exc.pos:]
+    if exc.msg.startswith("Invalid \\uXXXX escape"):
+        return _ESCAPE_TAIL.match(tail) is not None
+    return _NUMBER_TAIL.match(tail) is not None or any(lit.startswith(tail) for lit in _LITERALS)
+
+
+class JSONStreamError(ValueError):
+    """Raised for malformed input; the message says where it went wrong."""
+
+
+class JSONStreamParser:
+    def __init__(self, fmt: str, max_document_bytes: int = 64 * 1024 * 1024):
+        if fmt not in (NDJSON, ARRAY):
+            raise ValueError(f"Unknown stream format '{fmt}'")
+        self.fmt = fmt
+        self.max_document_bytes = max_document_bytes
+        # Documents returned so far
+        self.count = 0
+
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._line = 0
+        # ndjson: buffer offset already searched for a newline
+        self._scanned = 0
+        # array state: "start", "value_or_end", "value", "sep", "done"
+        self._state = "start"
+        # Pending length below which an incomplete array element is not
+        # re-parsed; doubling it keeps large documents linear to parse.
+        self._retry_len = 0
+
+    def feed(self, data: bytes) -> List[Any]:
+        try:
+            self._buf += self._text.decode(data)
+        except UnicodeDecodeError as exc:
+            raise JSONStreamError(f"Invalid UTF-8 in upload: {exc.reason}") from exc
+        return self._drain(final=False)
+
+    def close(self) -> List[Any]:
+        """Parse whatever is left once the input has ended."""
+        try:
+            self._buf += self._text.decode(b"", final=True)
+        except UnicodeDecodeError as exc:
+            raise JSONStreamError(f"Invalid UTF-8 in upload: {exc.reason}") from exc
+        documents = self._drain(final=True)
+
+        if self.fmt == ARRAY and self._state != "done":
+            if self._state == "start":
+                raise JSONStreamError("Expected a JSON array")
+            raise JSONStreamError(f"Unexpected end of input after {self.count} documents")
+        return documents
+
+    def _drain(self, final: bool) -> List[Any]:
+        if self.fmt == NDJSON:
+            documents, pos = self._drain_ndjson(final)
+        else:
+            documents, pos = self._drain_array(final)
+
+        self._buf = self._buf[pos:]
+        if not final and len(self._buf) > self.max_document_bytes:
+            raise JSONStreamError(
+                f"Document {self.count + 1} exceeds {self.max_document_bytes} bytes"
+            )
+        return documents
+
+    def _drain_ndjson(self, final: bool):
+        buf = self._buf
+        documents = []
+        pos = 0
+        while True:
+            end = buf.find("\n", max(pos, self._scanned))
+            if end == -1:
+                if final and pos < len(buf):
+                    self._parse_line(buf[pos:], documents)
+                    pos = len(buf)
+                self._scanned = len(buf) - pos
+                break
+            self._parse_line(buf[pos:end], documents)
+            pos = end + 1
+        return documents, pos
+
+    def _parse_line(self, line: str, documents: List[Any]):
+        self._line += 1
+        if not line.strip():
+            return
+        try:
+            documents.append(json.loads(line))
+        except json.JSONDecodeError as exc:
+            raise JSONStreamError(f"Line {self._line}: {exc.msg}") from exc
+        self.count += 1
+
+    def _drain_array(self, final: bool):
+        buf = self._buf
+        documents = []
+        i = 0
+        while True:
+            i = _WS.match(buf, i).end()
+            if i == len(buf):
+                break
+            c = buf[i]
+
+            if self._state == "start":
+                if c != "[":
+                    raise JSONStreamError("Expected a JSON array")
+                self._state = "value_or_end"
+                i += 1
+                continue
+
+            if self._state == "done":
+                raise JSONStreamError("Unexpected data after the closing ']'")
+
+            if self._state == "sep":
+                if c == ",":
+                    self._state = "value"
+                elif c == "]":
+                    self._state = "done"
+                else:
+                    raise JSONStreamError(
+                        f"Expected ',' or ']' after document {self.count}"
+                    )
+                i += 1
+                continue
+
+            if c == "]" and self._state == "value_or_end":
+                self._state = "done"
+                i += 1
+                continue
+
+            if not final and len(buf) - i < self._retry_len:
+                break
+            try:
+                document, end = _decoder.raw_decode(buf, i)
+            except json.JSONDecodeError as exc:
+                if final or not _may_continue(exc):
+                    raise JSONStreamError(f"Document {self.count + 1}: {exc.msg}") from exc
+                # Cut off mid-document; wait for more input. Capped so the
+                # document is parsed again before the size limit is hit.
+                self._retry_len = min(2 * (len(buf) - i), self.max_document_bytes)
+                break
+            if (
+                not final
+                and isinstance(document, (int, float))
+                and not isinstance(document, bool)
+                and (end == len(buf) or buf[end] in _NUMBER_CHARS)
+            ):
+                # A bare number ending at, or just before, a cut ("[1." + "5]")
+                # may still continue.
+                self._retry_len = len(buf) - i + 1
+                break
+
+            documents.append(document)
+            self.count += 1
+            self._retry_len = 0
+            self._state = "sep"
+            i = end
+        return documents, i
@@ -1,12 +1,210 @@
 import json
+import re
+import threading
+from collections import OrderedDict
 from copy import deepcopy
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 from jsonpath_ng import parse
 
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.models.mapping import MappingProfile, MappingRule, MappingAction
+from app.utils.transform_expr import TransformError, compile_expression
+
+
+# ---------------------------------------------------------
+# Compiled paths
+# ---------------------------------------------------------
+
+# Marker for "path not present", distinct from a stored null.
+MISSING = object()
+
+_SIMPLE_PATH_RE = re.compile(
+    r"""^\$((?:\.[A-Za-z_@][\w@\-]*|\[-?\d+\]|\['[^'\]]*'\]|\["[^"\]]*"\])*)$"""
+)
+_STEP_RE = re.compile(
+    r"""\.([A-Za-z_@][\w@\-]*)|\[(-?\d+)\]|\['([^'\]]*)'\]|\["([^"\]]*)"\]"""
+)
+
+
+class SimplePath:
+    """
+    Plain field/index path such as $.a.b.c or $.items[3].x, walked
+    directly over dicts and lists. set() creates missing intermediate
+    objects (and arrays, for index steps) along the way.
+    """
+
+    __slots__ = ("path", "steps")
+
+    def __init__(self, path: str, steps: Tuple[Any, ...]):
+        self.path = path
+        self.steps = steps
+
+    def get(self, root: Any) -> Any:
+        node = root
+        for step in self.steps:
+            if type(step) is int:
+                if not isinstance(node, list) or not -len(node) <= step < len(node):
+                    return MISSING
+            elif not isinstance(node, dict) or step not in node:
+                return MISSING
+            node = node[step]
+        return node
+
+    def set(self, root: Any, value: Any):
+        if not self.steps:
+            raise ValueError("Cannot replace the document root")
+
+        node = root
+        for step, next_step in zip(self.steps, self.steps[1:]):
+            child = self._read(node, step)
+            if child is None or child is MISSING:
+                child = [] if type(next_step) is int else {}
+                self._write(node, step, child)
+            elif not isinstance(child, (dict, list)):
+                raise TypeError(f"Cannot set {self.path}: {step!r} is not an object or array")
+            node = child
+
+        self._write(node, self.steps[-1], value)
+        return root
+
+    def _read(self, node: Any, step: Any) -> Any:
+        if type(step) is int:
+            if not isinstance(node, list):
+                raise TypeError(f"Cannot set {self.path}: [{step}] applied to a non-array")
+            return node[step] if -len(node) <= step < len(node) else MISSING
+        if not isinstance(node, dict):
+            raise TypeError(f"Cannot set {self.path}: {step!r} applied to a non-object")
+        return node.get(step, MISSING)
+
+    def _write(self, node: Any, step: Any, value: Any):
+        if type(step) is int:
+            if not isinstance(node, list):
+                raise TypeError(f"Cannot set {self.path}: [{step}] applied to a non-array")
+            if step < 0 and -step > len(node):
+                raise IndexError(f"Cannot set {self.path}: index {step} out of range")
+            if step >= len(node):
+                node.extend([None] * (step + 1 - len(node)))
+            node[step] = value
+        else:
+            if not isinstance(node, dict):
+                raise TypeError(f"Cannot set {self.path}: {step!r} applied to a non-object")
+            node[step] = value
+
+
+class QueryPath:
+    """Wildcard, filter, slice or recursive path, evaluated with jsonpath_ng."""
+
+    __slots__ = ("path", "expr")
+
+    def __init__(self, path: str, expr: Any):
+        self.path = path
+        self.expr = expr
+
+    def get(self, root: Any) -> Any:
+        matches = self.expr.find(root)
+        if not matches:
+            return MISSING
+        if len(matches) == 1:
+            return matches[0].value
+        return [m.value for m in matches]
+
+    def set(self, root: Any, value: Any):
+        # Overwrites every match; creates the path where jsonpath_ng can.
+        self.expr.update_or_create(root, value)
+        return root
+
+
+def _parse_simple_path(path: str) -> Optional[Tuple[Any, ...]]:
+    path = path.strip()
+    if path and not path.startswith("$"):
+        path = "$." + path
+    if not _SIMPLE_PATH_RE.match(path):
+        return None
+
+    steps = []
+    for name, index, single, double in _STEP_RE.findall(path[1:]):
+        if index:
+            steps.append(int(index))
+        else:
+            steps.append(name or single or double)
+    return tuple(steps)
+
+
+def _compile_path_uncached(path: str) -> Any:
+    steps = _parse_simple_path(path)
+    if steps is not None:
+        return SimplePath(path, steps)
+    return QueryPath(path, parse(path))
+
+
+# ---------------------------------------------------------
+# Compiled path cache
+# ---------------------------------------------------------
+
+class CompiledPathCache:
+    """
+    Process-wide LRU cache of compiled paths (SimplePath / QueryPath).
+    Every distinct path is parsed once per worker; the least recently
+    used entries are evicted once maxsize is exceeded.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str) -> Any:
+        with self._lock:
+            expr = self._entries.get(path)
+            if expr is not None:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return expr
+            self.misses += 1
+
+        # Parse outside the lock; a concurrent miss on the same path
+        # just parses twice and the last writer wins.
+        expr = _compile_path_uncached(path)
+
+        with self._lock:
+            self._entries[path] = expr
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return expr
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_path_cache = CompiledPathCache(maxsize=settings.JSONPATH_CACHE_SIZE)
+
+
+def compile_path(path: str) -> Any:
+    """Return the cached, compiled path object for path."""
+    return _path_cache.get(path)
+
+
+def path_cache_stats() -> dict:
+    return _path_cache.stats()
 
 
 # ---------------------------------------------------------
@@ -15,94 +213,355 @@ from app.models.mapping import MappingProfile, MappingRule, MappingAction
 
 def json_get(root: Any, path: str) -> Any:
     """Extract value(s) using JSONPath."""
-    expr = parse(path)
-    matches = expr.find(root)
-    if not matches:
-        return None
-    if len(matches) == 1:
-        return matches[0].value
-    return [m.value for m in matches]
+    return _get_compiled(root, compile_path(path))
 
 
 def json_set(root: Any, path: str, value: Any):
-    """Set or overwrite value(s) using JSONPath."""
-    expr = parse(path)
-    matches = expr.find(root)
+    """
+    Set or overwrite value(s) using JSONPath. Missing intermediate
+    objects and arrays are created for plain field/index paths.
+    """
+    return _set_compiled(root, compile_path(path), value)
+
+
+def _get_compiled(root: Any, expr: Any) -> Any:
+    value = expr.get(root)
+    return None if value is MISSING else value
+
+
+def _set_compiled(root: Any, expr: Any, value: Any):
+    return expr.set(root, value)
+
+
+# ---------------------------------------------------------
+# Batch extraction
+# ---------------------------------------------------------
+
+class _TrieNode:
+    __slots__ = ("children", "slots")
+
+    def __init__(self):
+        self.children: Dict[Any, "_TrieNode"] = {}
+        self.slots: List[int] = []
+
+
+class PathExtractor:
+    """
+    A fixed set of paths pulled out of a document in one traversal.
+    Plain paths are merged into a trie so shared prefixes are walked once;
+    query paths (wildcards, filters) are evaluated with jsonpath_ng.
+    Values for absent paths are the MISSING marker.
+    """
 
-    if matches:
-        # Overwrite existing nodes
-        for match in matches:
-            full_path = match.full_path
-            full_path.update(root, value)
-    else:
-        # Create missing nodes if path doesn't exist
-        # jsonpath-ng does not auto-create. So we only assign at root level.
-        # If deep path creation is needed, implement manually.
-        root[path.replace("$.","")] = value
+    def __init__(self, paths: List[str]):
+        self.paths: Tuple[str, ...] = tuple(dict.fromkeys(paths))
+        self._root = _TrieNode()
+        self._queries: List[Tuple[int, QueryPath]] = []
 
-    return root
+        for slot, path in enumerate(self.paths):
+            compiled = compile_path(path)
+            if isinstance(compiled, SimplePath):
+                node = self._root
+                for step in compiled.steps:
+                    node = node.children.setdefault(step, _TrieNode())
+                node.slots.append(slot)
+            else:
+                self._queries.append((slot, compiled))
+
+    def __reduce__(self):
+        return (PathExtractor, (list(self.paths),))
+
+    def slot(self, path: str) -> int:
+        return self.paths.index(path)
+
+    def extract(self, document: Any) -> List[Any]:
+        """Return one value per path (in self.paths order) for document."""
+        row = [MISSING] * len(self.paths)
+        _walk_trie(document, self._root, row)
+        for slot, query in self._queries:
+            row[slot] = query.get(document)
+        return row
+
+    def extract_columns(self, documents: Iterable[Any]) -> Dict[str, List[Any]]:
+        """Return {path: [value per document]} for documents, in order."""
+        columns: List[List[Any]] = [[] for _ in self.paths]
+        for document in documents:
+            for column, value in zip(columns, self.extract(document)):
+                column.append(value)
+        return dict(zip(self.paths, columns))
+
+
+def _walk_trie(node: Any, trie: _TrieNode, row: List[Any]):
+    for slot in trie.slots:
+        row[slot] = node
+    for step, child in trie.children.items():
+        if type(step) is int:
+            if isinstance(node, list) and -len(node) <= step < len(node):
+                _walk_trie(node[step], child, row)
+        elif isinstance(node, dict) and step in node:
+            _walk_trie(node[step], child, row)
+
+
+def extract_columns(documents: Iterable[Any], paths: List[str]) -> Dict[str, List[Any]]:
+    """
+    Column-oriented extraction of paths from many documents:
+    {path: [value per document]}, with MISSING where a path is absent.
+    """
+    return PathExtractor(paths).extract_columns(documents)
 
 
 # ---------------------------------------------------------
 # Transformation evaluator
 # ---------------------------------------------------------
 
+def compile_transform(expr: str) -> Callable[[Any], Any]:
+    """
+    Compile a transform expression once into a callable.
+    See app.utils.transform_expr for the supported syntax.
+    """
+    return compile_expression(expr)
+
+
 def apply_transform(value: Any, expr: Optional[str]) -> Any:
-    """Optional Python expression to transform the value."""
+    """
+    Optional sandboxed expression to transform the value.
+    Raises TransformError if the expression is invalid or fails.
+    """
     if not expr:
         return value
-    try:
-        local = {"value": value}
-        return eval(expr, {}, local)
-    except Exception:
-        return value
+    return compile_transform(expr)(value)
 
 
 # ---------------------------------------------------------
-# Main executor
+# Compiled profiles
 # ---------------------------------------------------------
 
-def apply_mapping_profile(profile_id: int, source_json: Any, db: Session) -> Any:
-    """Convert JSON using mapping rules."""
+class CompiledRule(NamedTuple):
+    rule_id: int
+    action: MappingAction
+    source_json_path: Optional[str]
+    source_expr: Any
+    target_json_path: str
+    target_expr: Any
+    default_value: Optional[str]
+    transform_expr: Optional[str]
+    transform: Optional[Callable[[Any], Any]]
+    # Set when a stored transform_expr no longer compiles
+    error: Optional[str] = None
+
+    def __reduce__(self):
+        # Compiled paths and transforms are not picklable; ship the rule
+        # definition instead and recompile on the receiving side.
+        return (_compile_rule, (
+            self.rule_id,
+            self.action,
+            self.source_json_path,
+            self.target_json_path,
+            self.default_value,
+            self.transform_expr,
+        ))
+
+
+class CompiledProfile(NamedTuple):
+    """Immutable execution plan for one version of a mapping profile."""
+    profile_id: int
+    version: int
+    rules: Tuple[CompiledRule, ...]
+    # Every rule's source path, extracted in one walk per document;
+    # source_slots[i] indexes rules[i]'s value in the extracted row.
+    extractor: PathExtractor
+    source_slots: Tuple[Optional[int], ...]
+
+
+def _compile_rule(
+    rule_id: int,
+    action: MappingAction,
+    source_json_path: Optional[str],
+    target_json_path: str,
+    default_value: Optional[str],
+    transform_expr: Optional[str],
+) -> CompiledRule:
+    transform = None
+    error = None
+    if transform_expr:
+        try:
+            transform = compile_transform(transform_expr)
+        except TransformError as exc:
+            error = str(exc)
+
+    source_expr = None
+    if source_json_path and action != MappingAction.ADD:
+        source_expr = compile_path(source_json_path)
+
+    return CompiledRule(
+        rule_id=rule_id,
+        action=action,
+        source_json_path=source_json_path,
+        source_expr=source_expr,
+        target_json_path=target_json_path,
+        target_expr=compile_path(target_json_path),
+        default_value=default_value,
+        transform_expr=transform_expr,
+        transform=transform,
+        error=error,
+    )
+
+
+def compile_profile(profile: MappingProfile, rules: List[MappingRule]) -> CompiledProfile:
+    """
+    Turn ordered rules into an execution plan: paths are pre-parsed,
+    transforms pre-compiled and IGNORE rules dropped.
+    """
+    compiled = tuple(
+        _compile_rule(
+            rule.id,
+            rule.action,
+            rule.source_json_path,
+            rule.target_json_path,
+            rule.default_value,
+            rule.transform_expr,
+        )
+        for rule in rules
+        if rule.action != MappingAction.IGNORE
+    )
+
+    source_paths = [r.source_json_path for r in compiled if r.source_expr is not None]
+    extractor = PathExtractor(source_paths)
+    source_slots = tuple(
+        extractor.slot(r.source_json_path) if r.source_expr is not None else None
+        for r in compiled
+    )
+
+    return CompiledProfile(
+        profile_id=profile.id,
+        version=profile.version or 0,
+        rules=compiled,
+        extractor=extractor,
+        source_slots=source_slots,
+    )
+
+
+_plan_cache: Dict[int, CompiledProfile] = {}
+_plan_cache_lock = threading.Lock()
+
+
+def get_compiled_profile(profile_id: int, db: Session) -> CompiledProfile:
+    """
+    Return the execution plan for a profile, compiling it on first use
+    and whenever the stored profile version moves past the cached one.
+    """
     profile = db.query(MappingProfile).get(profile_id)
     if not profile:
         raise ValueError("MappingProfile not found")
 
+    with _plan_cache_lock:
+        plan = _plan_cache.get(profile_id)
+    if plan is not None and plan.version == (profile.version or 0):
+        return plan
+
     rules = (
         db.query(MappingRule)
         .filter(MappingRule.profile_id == profile_id)
         .order_by(MappingRule.order_index.asc())
         .all()
     )
+    plan = compile_profile(profile, rules)
+
+    with _plan_cache_lock:
+        _plan_cache[profile_id] = plan
+    return plan
+
+
+def invalidate_profile(profile_id: int):
+    with _plan_cache_lock:
+        _plan_cache.pop(profile_id, None)
+
+
+def bump_profile_version(db: Session, profile_id: int):
+    """Mark a profile as changed so every worker recompiles its plan."""
+    db.query(MappingProfile).filter(MappingProfile.id == profile_id).update(
+        {MappingProfile.version: MappingProfile.version + 1},
+        synchronize_session=False,
+    )
+    invalidate_profile(profile_id)
+
+
+# ---------------------------------------------------------
+# Main executor
+# ---------------------------------------------------------
 
+def execute_plan(
+    plan: CompiledProfile,
+    source_json: Any,
+    errors: Optional[List[dict]] = None,
+) -> Any:
+    """
+    Run a compiled profile over one source document.
+    A rule whose transform fails, or whose target cannot be set, is
+    skipped; the failure is appended to errors (if given) as
+    {"rule_id", "target_json_path", "error"}.
+    """
     target = {}
+    row = plan.extractor.extract(source_json)
 
-    for rule in rules:
+    for rule, slot in zip(plan.rules, plan.source_slots):
         action = rule.action
 
+        if rule.error is not None:
+            _record_error(errors, rule, rule.error)
+            continue
+
         # MAP
         if action == MappingAction.MAP:
-            src_val = json_get(source_json, rule.source_json_path)
-            if src_val is None:
+            val = row[slot] if slot is not None else None
+            if val is None or val is MISSING:
                 continue
-            src_val = apply_transform(src_val, rule.transform_expr)
-            json_set(target, rule.target_json_path, src_val)
-
-        # IGNORE
-        elif action == MappingAction.IGNORE:
-            continue
 
         # DEFAULT
         elif action == MappingAction.DEFAULT:
-            src_val = json_get(source_json, rule.source_json_path)
-            if src_val is None:
-                src_val = rule.default_value
-            src_val = apply_transform(src_val, rule.transform_expr)
-            json_set(target, rule.target_json_path, src_val)
+            val = row[slot] if slot is not None else None
+            if val is None or val is MISSING:
+                val = rule.default_value
 
         # ADD
         elif action == MappingAction.ADD:
-            val = apply_transform(rule.default_value, rule.transform_expr)
-            json_set(target, rule.target_json_path, val)
+            val = rule.default_value
+
+        else:
+            continue
+
+        if rule.transform:
+            try:
+                val = rule.transform(val)
+            except TransformError as exc:
+                _record_error(errors, rule, str(exc))
+                continue
+
+        try:
+            _set_compiled(target, rule.target_expr, val)
+        except (TypeError, ValueError, IndexError, KeyError, AttributeError) as exc:
+            # Conflicting targets (e.g. $.out.x and $.out.x.y) or "$":
+            # skip the rule like a failed transform.
+            _record_error(errors, rule, str(exc))
 
     return target
+
+
+def _record_error(errors: Optional[List[dict]], rule: CompiledRule, message: str):
+    if errors is not None:
+        errors.append({
+            "rule_id": rule.rule_id,
+            "target_json_path": rule.target_json_path,
+            "error": message,
+        })
+
+
+def apply_mapping_profile(
+    profile_id: int,
+    source_json: Any,
+    db: Session,
+    errors: Optional[List[dict]] = None,
+) -> Any:
+    """Convert JSON using mapping rules."""
+    plan = get_compiled_profile(profile_id, db)
+    return execute_plan(plan, source_json, errors)
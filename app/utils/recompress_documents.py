@@ -0,0 +1,245 @@
+# app/utils/recompress_documents.py
+"""
+Rewrite stored documents to a compression setting, chunk by chunk.
+
+    python -m app.utils.recompress_documents --codec zlib --train
+    python -m app.utils.recompress_documents --json-type 3 --after-id 120000
+    python -m app.utils.recompress_documents --codec none   # back to JSON columns
+
+--train first builds a new dictionary per json_type from its most recent
+documents. Rows are then read in id order, chunk_size at a time (keyset,
+so an interrupted run resumes with --after-id), and rewritten with one
+executemany UPDATE and a commit per chunk. Rows already stored with the
+target codec and their json_type's current dictionary are left alone,
+so rerunning after training a new dictionary only touches older rows.
+
+The codec defaults to DOCUMENT_COMPRESSION; set that to the same value
+so new uploads and conversions are written the same way. MySQL only
+returns the space of emptied JSON columns once the table is rebuilt
+(OPTIMIZE TABLE json_document).
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, distinct, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.connection import SessionLocal
+from app.models.compression_dictionary import CompressionDictionary
+from app.models.json_documents import JSONDocument
+from app.utils.json_compression import (
+    NONE,
+    ZLIB,
+    ZSTD,
+    CompressionError,
+    build_dictionary,
+    get_dictionary_registry,
+    packed_info,
+    storage_codec,
+    storage_values,
+    stored_size,
+    unpack_json,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def train_dictionary(
+    db: Session,
+    json_type_id: int,
+    codec: Optional[str] = None,
+    samples: Optional[int] = None,
+    size: Optional[int] = None,
+) -> CompressionDictionary:
+    """Build and store a new dictionary for json_type_id from its latest documents."""
+    codec = storage_codec(codec)
+    documents = (
+        db.query(JSONDocument)
+        .filter(JSONDocument.json_type_id == json_type_id)
+        .order_by(JSONDocument.id.desc())
+        .limit(samples or settings.DOCUMENT_DICT_SAMPLES)
+        .all()
+    )
+    values = []
+    for doc in documents:
+        values.append(doc.raw_json)
+        values.append(doc.normalized_json)
+
+    dictionary = CompressionDictionary(
+        json_type_id=json_type_id,
+        codec=codec,
+        data=build_dictionary(codec, values, size),
+        sample_count=len(documents),
+    )
+    db.add(dictionary)
+    db.commit()
+    db.refresh(dictionary)
+    get_dictionary_registry().refresh(json_type_id)
+    return dictionary
+
+
+def _rewrite(plain, packed, json_type_id: int, codec: str, dictionary_id: Optional[int]):
+    """New (plain, packed) for one column, or None if it is already stored so."""
+    if plain is None and packed is None:
+        return None
+    if codec == NONE:
+        if packed is None:
+            return None
+    elif packed is not None and packed_info(packed) == (codec, dictionary_id):
+        return None
+
+    value = unpack_json(packed) if packed is not None else plain
+    return storage_values(value, json_type_id, codec)
+
+
+def recompress_documents(
+    db: Session,
+    json_type_id: Optional[int] = None,
+    codec: Optional[str] = None,
+    chunk_size: int = 500,
+    after_id: int = 0,
+    progress: Optional[Callable[[int, Dict[str, int]], None]] = None,
+) -> dict:
+    """
+    Store every document (of json_type_id, or all) under codec. Returns
+    counts and stored sizes before/after; sizes of JSON-column values are
+    measured as compact JSON text, so "before" is approximate for them.
+    """
+    codec = storage_codec(codec)
+    registry = get_dictionary_registry()
+    started = time.perf_counter()
+
+    c = JSONDocument.__table__.c
+    rewrite = (
+        update(JSONDocument.__table__)
+        .where(c.id == bindparam("doc_id"))
+        .values(
+            raw_json=bindparam("raw_plain"),
+            raw_json_packed=bindparam("raw_packed"),
+            normalized_json=bindparam("normalized_plain"),
+            normalized_json_packed=bindparam("normalized_packed"),
+        )
+    )
+
+    counts = {"scanned": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = after_id
+    while True:
+        query = select(
+            c.id, c.json_type_id,
+            c.raw_json, c.raw_json_packed,
+            c.normalized_json, c.normalized_json_packed,
+        ).where(c.id > last_id)
+        if json_type_id is not None:
+            query = query.where(c.json_type_id == json_type_id)
+        rows = db.execute(query.order_by(c.id.asc()).limit(chunk_size)).all()
+        if not rows:
+            break
+
+        updates: List[dict] = []
+        for row in rows:
+            counts["scanned"] += 1
+            dictionary_id = registry.current(row.json_type_id, codec) if codec != NONE else None
+            raw = _rewrite(row.raw_json, row.raw_json_packed, row.json_type_id, codec, dictionary_id)
+            normalized = _rewrite(
+                row.normalized_json, row.normalized_json_packed,
+                row.json_type_id, codec, dictionary_id,
+            )
+            if raw is None and normalized is None:
+                continue
+
+            raw = raw or (row.raw_json, row.raw_json_packed)
+            normalized = normalized or (row.normalized_json, row.normalized_json_packed)
+            counts["rewritten"] += 1
+            counts["bytes_before"] += (
+                stored_size(row.raw_json, row.raw_json_packed)
+                + stored_size(row.normalized_json, row.normalized_json_packed)
+            )
+            counts["bytes_after"] += stored_size(*raw) + stored_size(*normalized)
+            updates.append({
+                "doc_id": row.id,
+                "raw_plain": raw[0],
+                "raw_packed": raw[1],
+                "normalized_plain": normalized[0],
+                "normalized_packed": normalized[1],
+            })
+
+        if updates:
+            db.execute(rewrite, updates)
+        db.commit()
+        last_id = rows[-1].id
+        if progress:
+            progress(last_id, counts)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "codec": codec,
+        "json_type_id": json_type_id,
+        "last_id": last_id,
+        **counts,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_second": round(counts["scanned"] / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _json_type_ids(db: Session) -> List[int]:
+    return [
+        json_type_id
+        for (json_type_id,) in db.query(distinct(JSONDocument.json_type_id)).all()
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compress, recompress or decompress stored documents."
+    )
+    parser.add_argument("--codec", choices=[NONE, ZLIB, ZSTD],
+                        help="target storage (default: DOCUMENT_COMPRESSION)")
+    parser.add_argument("--json-type", type=int, help="only documents of this json_type")
+    parser.add_argument("--train", action="store_true",
+                        help="train a new dictionary per json_type first")
+    parser.add_argument("--samples", type=int, default=settings.DOCUMENT_DICT_SAMPLES,
+                        help="documents sampled per dictionary")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--after-id", type=int, default=0,
+                        help="resume after this document id")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    session = SessionLocal()
+    try:
+        target = storage_codec(args.codec)
+        if args.train:
+            if target == NONE:
+                parser.error("--train needs a codec other than 'none'")
+            type_ids = [args.json_type] if args.json_type is not None else _json_type_ids(session)
+            for type_id in type_ids:
+                try:
+                    trained = train_dictionary(session, type_id, target, samples=args.samples)
+                except CompressionError as exc:
+                    logger.warning("json_type %s: no dictionary (%s)", type_id, exc)
+                    continue
+                logger.info(
+                    "json_type %s: dictionary %s, %d bytes from %d documents",
+                    type_id, trained.id, len(trained.data), trained.sample_count,
+                )
+
+        summary = recompress_documents(
+            session,
+            json_type_id=args.json_type,
+            codec=target,
+            chunk_size=max(1, args.chunk_size),
+            after_id=args.after_id,
+            progress=lambda last, counts: logger.info(
+                "up to id %s: %d scanned, %d rewritten, %d -> %d bytes",
+                last, counts["scanned"], counts["rewritten"],
+                counts["bytes_before"], counts["bytes_after"],
+            ),
+        )
+        print(json.dumps(summary, indent=2))
+    finally:
+        session.close()
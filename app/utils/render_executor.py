@@ -0,0 +1,152 @@
+# app/utils/render_executor.py
+
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from app.config import settings
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """
+    The process-wide pool of EXPORT_RENDER_WORKERS spawned workers,
+    started on first use and shared by every export, so workers (and
+    their template caches) outlive a single request.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.EXPORT_RENDER_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    # A worker died; the next export starts a fresh pool.
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RenderExecutor:
+    """
+    Runs a CPU-bound render function over many jobs on the shared render
+    pool, yielding (key, job, result) in submission order. result is the
+    rendered bytes or the exception the job raised.
+
+    Jobs must be picklable and render_fn a module-level function. Items
+    whose job is already bytes (e.g. a cache hit) or an Exception (e.g. a
+    failed lookup in the parent) are passed through untouched. With one
+    worker, or when only a single job is submitted, rendering happens
+    in-process.
+    """
+
+    def __init__(
+        self,
+        render_fn: Callable[[Any], bytes],
+        workers: Optional[int] = None,
+    ):
+        self.render_fn = render_fn
+        self.workers = max(1, workers or settings.EXPORT_RENDER_WORKERS)
+        self._in_flight: deque = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        # The pool is shared; only drop this executor's unstarted jobs.
+        while self._in_flight:
+            pending = self._in_flight.popleft()[2]
+            if isinstance(pending, Future):
+                pending.cancel()
+
+    def _render_local(self, job: Any) -> Any:
+        if _is_done(job):
+            return job
+        try:
+            return self.render_fn(job)
+        except Exception as exc:
+            return exc
+
+    def render(self, items: Iterable[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Any, Any]]:
+        it = iter(items)
+
+        if self.workers == 1:
+            for key, job in it:
+                yield key, job, self._render_local(job)
+            return
+
+        first = next(it, None)
+        if first is None:
+            return
+        second = next(it, None)
+        if second is None:
+            key, job = first
+            yield key, job, self._render_local(job)
+            return
+
+        # Keep a bounded window of jobs in flight so memory does not grow
+        # with the number of documents.
+        window = self.workers * 4
+        in_flight = self._in_flight
+        pool = get_render_pool()
+
+        def submit(key, job):
+            if _is_done(job):
+                in_flight.append((key, job, job))
+            else:
+                in_flight.append((key, job, pool.submit(self.render_fn, job)))
+
+        def take():
+            item = _resolve(*in_flight.popleft())
+            if isinstance(item[2], BrokenProcessPool):
+                _discard_pool(pool)
+            return item
+
+        try:
+            submit(*first)
+            submit(*second)
+            for key, job in it:
+                if len(in_flight) >= window:
+                    yield take()
+                submit(key, job)
+            while in_flight:
+                yield take()
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+
+
+def _is_done(job: Any) -> bool:
+    return isinstance(job, (bytes, Exception))
+
+
+def _resolve(key: Any, job: Any, pending: Any) -> Tuple[Any, Any, Any]:
+    if isinstance(pending, Future):
+        try:
+            return key, job, pending.result()
+        except Exception as exc:
+            return key, job, exc
+    return key, job, pending
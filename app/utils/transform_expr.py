@@ -0,0 +1,456 @@
+# app/utils/transform_expr.py
+"""
+Sandboxed transform expressions for mapping rules.
+
+Expressions use a small, Python-like syntax evaluated against a single
+variable, ``value``:
+
+    upper(value)
+    value.strip().lower()
+    value * 100 if value is not None else 0
+    concat(value, " marks")
+    date(value, "%d/%m/%Y", "%Y-%m-%d")
+    lookup(value, {"A": 1, "B": 2}, 0)
+
+Only literals, ``value``, arithmetic, comparisons, boolean logic,
+conditionals, subscripts and the whitelisted functions/methods below are
+accepted. Expressions are parsed and validated once and compiled into a
+tree of closures, so evaluating a value is a plain function call.
+"""
+
+import ast
+import operator
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+MAX_EXPR_LENGTH = 2000
+MAX_RESULT_LENGTH = 100_000
+
+
+class TransformError(ValueError):
+    """Raised for invalid expressions and for failures while evaluating them."""
+
+
+# ---------------------------------------------------------
+# Built-in functions
+# ---------------------------------------------------------
+
+def _nested_size(value: Any, limit: int = MAX_RESULT_LENGTH) -> int:
+    # Elements plus string characters reachable from value, counting shared
+    # references every time (as str() and json.dumps would). Stops once past
+    # limit, so the walk itself stays cheap.
+    total = 0
+    stack = [value]
+    while stack and total <= limit:
+        item = stack.pop()
+        if isinstance(item, str):
+            total += len(item)
+        elif isinstance(item, (list, tuple)):
+            total += len(item)
+            stack.extend(item)
+        elif isinstance(item, dict):
+            total += len(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+    return total
+
+
+def _to_str(value: Any, limit: int = MAX_RESULT_LENGTH) -> str:
+    """str(value), refused as soon as the text would exceed limit characters."""
+    if not isinstance(value, (list, tuple, dict)):
+        text = value if isinstance(value, str) else str(value)
+        if len(text) > limit:
+            raise TransformError("Expression result is too large")
+        return text
+
+    parts = []
+    size = 0
+
+    def emit(text: str):
+        nonlocal size
+        size += len(text)
+        if size > limit:
+            raise TransformError("Expression result is too large")
+        parts.append(text)
+
+    def walk(item: Any):
+        if isinstance(item, dict):
+            emit("{")
+            for n, (k, v) in enumerate(item.items()):
+                if n:
+                    emit(", ")
+                walk(k)
+                emit(": ")
+                walk(v)
+            emit("}")
+        elif isinstance(item, (list, tuple)):
+            emit("[" if isinstance(item, list) else "(")
+            for n, v in enumerate(item):
+                if n:
+                    emit(", ")
+                walk(v)
+            if isinstance(item, tuple):
+                emit(",)" if len(item) == 1 else ")")
+            else:
+                emit("]")
+        else:
+            if isinstance(item, str) and len(item) + size > limit:
+                raise TransformError("Expression result is too large")
+            emit(repr(item))
+
+    walk(value)
+    return "".join(parts)
+
+
+def _str(value: Any = "") -> str:
+    return _to_str(value)
+
+
+def _concat(*parts: Any) -> str:
+    out = []
+    size = 0
+    for p in parts:
+        if p is None:
+            continue
+        text = _to_str(p, MAX_RESULT_LENGTH - size)
+        size += len(text)
+        out.append(text)
+    return "".join(out)
+
+
+def _substr(s: Any, start: int, end: Any = None) -> str:
+    return _to_str(s)[start:end]
+
+
+def _join(sep: Any, items: Any) -> str:
+    sep = _to_str(sep)
+    parts = []
+    size = 0
+    for i in items:
+        if parts:
+            size += len(sep)
+        text = "" if i is None else _to_str(i, MAX_RESULT_LENGTH - size)
+        size += len(text)
+        if size > MAX_RESULT_LENGTH:
+            raise TransformError("Expression result is too large")
+        parts.append(text)
+    return sep.join(parts)
+
+
+def _lookup(key: Any, mapping: Dict, default: Any = None) -> Any:
+    return mapping.get(key, default)
+
+
+def _coalesce(*args: Any) -> Any:
+    for arg in args:
+        if arg is not None and arg != "":
+            return arg
+    return None
+
+
+def _date(s: Any, in_fmt: str, out_fmt: Any = None) -> str:
+    parsed = datetime.strptime(_to_str(s).strip(), in_fmt)
+    if out_fmt is None:
+        return parsed.date().isoformat()
+    return parsed.strftime(out_fmt)
+
+
+def _check_str_call(s: str, name: str, args: tuple):
+    # Refuse calls whose result would blow past MAX_RESULT_LENGTH before
+    # _check_size gets to see it.
+    size = None
+    if name == "zfill" and args and isinstance(args[0], int):
+        size = args[0]
+    elif name == "replace" and len(args) >= 2 and isinstance(args[0], str) and isinstance(args[1], str):
+        old, new = args[0], args[1]
+        count = s.count(old) if old else len(s) + 1
+        if len(args) > 2 and isinstance(args[2], int) and args[2] >= 0:
+            count = min(count, args[2])
+        size = len(s) + count * (len(new) - len(old))
+    elif name == "join" and args and isinstance(args[0], (list, tuple)):
+        items = args[0]
+        size = len(s) * max(len(items) - 1, 0) + sum(
+            len(i) for i in items if isinstance(i, str)
+        )
+    if size is not None and size > MAX_RESULT_LENGTH:
+        raise TransformError("Expression result is too large")
+
+
+def _str_method(name: str) -> Callable:
+    def _call(s: Any, *args: Any) -> Any:
+        s = _to_str(s)
+        _check_str_call(s, name, args)
+        return getattr(s, name)(*args)
+    return _call
+
+
+FUNCTIONS: Dict[str, Callable] = {
+    # casing / whitespace
+    "upper": _str_method("upper"),
+    "lower": _str_method("lower"),
+    "title": _str_method("title"),
+    "capitalize": _str_method("capitalize"),
+    "strip": _str_method("strip"),
+    "replace": _str_method("replace"),
+    "split": _str_method("split"),
+    "startswith": _str_method("startswith"),
+    "endswith": _str_method("endswith"),
+    # strings
+    "concat": _concat,
+    "substr": _substr,
+    "join": _join,
+    # conversions
+    "str": _str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "len": len,
+    # numbers
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    # misc
+    "date": _date,
+    "lookup": _lookup,
+    "coalesce": _coalesce,
+}
+
+# Methods callable on values, e.g. value.strip().upper()
+METHODS = {
+    str: {
+        "upper", "lower", "title", "capitalize", "strip", "lstrip", "rstrip",
+        "replace", "split", "startswith", "endswith", "zfill", "join",
+    },
+    dict: {"get"},
+    list: {"index", "count"},
+}
+
+
+def _safe_mul(a: Any, b: Any) -> Any:
+    # Refuse sequence repetition that would blow up before _check_size runs.
+    # Lists count their nested contents: [[1] * 1000] * 1000 is only a
+    # thousand references, but a million items once stringified or dumped.
+    for seq, n in ((a, b), (b, a)):
+        if isinstance(seq, (str, list, tuple)) and isinstance(n, int):
+            if _nested_size(seq) * n > MAX_RESULT_LENGTH:
+                raise TransformError("Expression result is too large")
+    return a * b
+
+
+def _safe_mod(a: Any, b: Any) -> Any:
+    # printf-style formatting can pad to any width ("%09999999999d"), so
+    # % is arithmetic only.
+    if isinstance(a, str):
+        raise TransformError("String % formatting is not allowed")
+    return a % b
+
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: _safe_mod,
+}
+
+_UNARY_OPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: operator.not_,
+}
+
+_CMP_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+
+def _check_size(result: Any) -> Any:
+    if isinstance(result, (str, list, tuple)) and len(result) > MAX_RESULT_LENGTH:
+        raise TransformError("Expression result is too large")
+    return result
+
+
+def _check_nested(result: Any) -> Any:
+    # For values the expression builds itself (operators and literals),
+    # which may nest references to the same large list.
+    if _nested_size(result) > MAX_RESULT_LENGTH:
+        raise TransformError("Expression result is too large")
+    return result
+
+
+# ---------------------------------------------------------
+# Compiler: AST node -> closure(value)
+# ---------------------------------------------------------
+
+def _compile_node(node: ast.AST) -> Callable[[Any], Any]:
+    if isinstance(node, ast.Constant):
+        const = node.value
+        if not isinstance(const, (str, int, float, bool, type(None))):
+            raise TransformError(f"Unsupported literal: {const!r}")
+        return lambda value: const
+
+    if isinstance(node, ast.Name):
+        if node.id != "value":
+            raise TransformError(f"Unknown name '{node.id}'")
+        return lambda value: value
+
+    if isinstance(node, ast.BinOp):
+        op = _BIN_OPS.get(type(node.op))
+        if op is None:
+            raise TransformError(f"Operator {type(node.op).__name__} is not allowed")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda value: _check_nested(op(left(value), right(value)))
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise TransformError(f"Operator {type(node.op).__name__} is not allowed")
+        operand = _compile_node(node.operand)
+        return lambda value: op(operand(value))
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile_node(v) for v in node.values]
+        if isinstance(node.op, ast.And):
+            def _and(value):
+                result = True
+                for fn in operands:
+                    result = fn(value)
+                    if not result:
+                        return result
+                return result
+            return _and
+
+        def _or(value):
+            result = False
+            for fn in operands:
+                result = fn(value)
+                if result:
+                    return result
+            return result
+        return _or
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left)
+        pairs = []
+        for op_node, comparator in zip(node.ops, node.comparators):
+            op = _CMP_OPS.get(type(op_node))
+            if op is None:
+                raise TransformError(f"Comparison {type(op_node).__name__} is not allowed")
+            pairs.append((op, _compile_node(comparator)))
+
+        def _compare(value):
+            current = left(value)
+            for op, right in pairs:
+                other = right(value)
+                if not op(current, other):
+                    return False
+                current = other
+            return True
+        return _compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = (
+            _compile_node(node.test), _compile_node(node.body), _compile_node(node.orelse)
+        )
+        return lambda value: body(value) if test(value) else orelse(value)
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compile_node(e) for e in node.elts]
+        return lambda value: _check_nested([fn(value) for fn in items])
+
+    if isinstance(node, ast.Dict):
+        if any(k is None for k in node.keys):
+            raise TransformError("Dict unpacking is not allowed")
+        pairs = [(_compile_node(k), _compile_node(v)) for k, v in zip(node.keys, node.values)]
+        return lambda value: _check_nested({k(value): v(value) for k, v in pairs})
+
+    if isinstance(node, ast.Subscript):
+        target = _compile_node(node.value)
+        if isinstance(node.slice, ast.Slice):
+            lower = _compile_node(node.slice.lower) if node.slice.lower else (lambda value: None)
+            upper = _compile_node(node.slice.upper) if node.slice.upper else (lambda value: None)
+            if node.slice.step is not None:
+                raise TransformError("Slice steps are not allowed")
+            return lambda value: target(value)[lower(value):upper(value)]
+        index = _compile_node(node.slice)
+        return lambda value: target(value)[index(value)]
+
+    if isinstance(node, ast.Call):
+        if node.keywords:
+            raise TransformError("Keyword arguments are not allowed")
+        args = [_compile_node(a) for a in node.args]
+
+        if isinstance(node.func, ast.Name):
+            fn = FUNCTIONS.get(node.func.id)
+            if fn is None:
+                raise TransformError(f"Unknown function '{node.func.id}'")
+            return lambda value: _check_size(fn(*[a(value) for a in args]))
+
+        if isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            if not any(method in names for names in METHODS.values()):
+                raise TransformError(f"Method '{method}' is not allowed")
+            obj = _compile_node(node.func.value)
+
+            def _call_method(value):
+                target = obj(value)
+                allowed = METHODS.get(type(target), ())
+                if method not in allowed:
+                    raise TransformError(
+                        f"Method '{method}' is not available on {type(target).__name__}"
+                    )
+                call_args = tuple(a(value) for a in args)
+                if isinstance(target, str):
+                    _check_str_call(target, method, call_args)
+                return _check_size(getattr(target, method)(*call_args))
+            return _call_method
+
+        raise TransformError("Only named functions and methods can be called")
+
+    raise TransformError(f"Unsupported syntax: {type(node).__name__}")
+
+
+def _wrap(fn: Callable[[Any], Any], source: str) -> Callable[[Any], Any]:
+    def _transform(value: Any) -> Any:
+        try:
+            return fn(value)
+        except TransformError:
+            raise
+        except Exception as exc:
+            raise TransformError(f"{type(exc).__name__}: {exc}") from exc
+
+    _transform.source = source
+    return _transform
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> Callable[[Any], Any]:
+    """
+    Parse, validate and compile an expression into a callable taking the
+    input value. Raises TransformError for invalid expressions; the
+    returned callable raises TransformError when evaluation fails.
+    """
+    if len(source) > MAX_EXPR_LENGTH:
+        raise TransformError("Expression is too long")
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise TransformError(f"Syntax error: {exc.msg}") from exc
+    return _wrap(_compile_node(tree.body), source)
+
+
+def validate_expression(source: str):
+    """Raise TransformError if source is not a valid transform expression."""
+    compile_expression(source)
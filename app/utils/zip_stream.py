@@ -0,0 +1,56 @@
+# app/utils/zip_stream.py
+
+import io
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, Tuple
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# Already-compressed formats are stored as-is.
+_STORED_EXTENSIONS = (".docx", ".zip", ".png", ".jpg", ".jpeg")
+
+
+def iter_zip(entries: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """
+    Build a ZIP archive from (name, data) entries and yield it piece by
+    piece as each entry is written, without ever holding the whole archive.
+    Entries are consumed lazily, so they can be produced on the fly.
+    """
+    sink = _ChunkSink()
+    timestamp = datetime.now().timetuple()[:6]
+
+    with zipfile.ZipFile(sink, mode="w") as archive:
+        for name, data in entries:
+            info = zipfile.ZipInfo(name, date_time=timestamp)
+            if name.lower().endswith(_STORED_EXTENSIONS):
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+
+    # Central directory, written on close.
+    tail = sink.drain()
+    if tail:
+        yield tail
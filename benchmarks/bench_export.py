@@ -0,0 +1,458 @@
+# benchmarks/bench_export.py
+"""
+Benchmarks for the export pipeline (app.utils.export_service).
+
+Runs the single-document path (generate_export) and the batch paths
+(iter_batch_exports, the base64 batch response, render_batch_merged)
+over synthetic documents and field config sets of varying size, for each
+format. The single-document path is split into stages so it shows where
+the time goes:
+
+    lookup     template / config set / field plan lookups
+    extract    field extraction and masking (prepare_export)
+    render     python-docx / reportlab rendering
+    base64     base64 encoding of the rendered file
+    serialise  JSON encoding of the response body
+
+Templates, config sets and documents live in an in-memory SQLite database
+standing in for MySQL. The artifact cache is disabled unless
+--artifact-cache is given, in which case batches are also timed warm.
+
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --docs 500 --sizes medium large
+    python -m benchmarks.bench_export --quick --json out.json
+    python -m benchmarks.bench_export --profile-dir prof/
+
+With --profile-dir the render stage of every case is run under cProfile
+and dumped as render_<format>_<size>.prof; the files load in snakeviz or
+pstats, and `flameprof render_PDF_large.prof > render.svg` turns one into
+a flamegraph.
+"""
+
+import argparse
+import base64
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.db.base import Base
+import app.models.category  # noqa: F401  (relationship targets)
+import app.models.mapping  # noqa: F401
+from app.models.export_template import ExportTemplate, ExportFormat
+from app.models.field_config import FieldConfigSet, FieldConfig, ExportMaskType
+from app.models.json_batch import JSONBatch
+from app.models.json_documents import JSONDocument
+from app.models.json_type import JSONType
+from app.utils.artifact_cache import get_artifact_cache
+from app.utils.export_service import (
+    generate_export,
+    iter_batch_exports,
+    prepare_export,
+    render_batch_merged,
+    render_job,
+    resolve_export_context,
+)
+from app.utils.template_cache import get_template_cache
+
+from benchmarks.bench_mapping_engine import percentiles
+
+
+# ---------------------------------------------------------
+# Synthetic documents and field configs
+# ---------------------------------------------------------
+
+# size -> (questions per document, words per answer)
+SIZES = {
+    "small": (3, 8),
+    "medium": (15, 30),
+    "large": (70, 120),
+}
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or "
+    "his from at which but have an they you were her all she there would their"
+).split()
+
+
+def make_document(rng: random.Random, questions: int, words: int) -> dict:
+    return {
+        "meta": {
+            "title": f"Paper {rng.randint(1, 10_000)}",
+            "subject": rng.choice(["Physics", "History", "Maths", "Biology"]),
+            "year": rng.randint(2000, 2025),
+        },
+        "items": [
+            {
+                "question": " ".join(rng.choices(WORDS, k=12)).capitalize() + "?",
+                "answer": " ".join(rng.choices(WORDS, k=words)),
+                "marks": rng.randint(1, 10),
+                "tags": rng.sample(WORDS, 3),
+            }
+            for _ in range(questions)
+        ],
+    }
+
+
+def make_field_configs(config_set_id: int, questions: int, first_id: int) -> List[FieldConfig]:
+    paths = [("$.meta.title", "Title"), ("$.meta.subject", "Subject"), ("$.meta.year", "Year")]
+    for i in range(questions):
+        paths += [
+            (f"$.items[{i}].question", f"Q{i + 1}"),
+            (f"$.items[{i}].answer", f"A{i + 1}"),
+            (f"$.items[{i}].marks", f"Marks {i + 1}"),
+            (f"$.items[{i}].tags", f"Tags {i + 1}"),
+        ]
+
+    configs = []
+    for index, (path, label) in enumerate(paths):
+        mask = ExportMaskType.NONE
+        if index % 11 == 10:
+            mask = ExportMaskType.HIDE_VALUE
+        elif index % 7 == 6:
+            mask = ExportMaskType.REDACT
+        configs.append(FieldConfig(
+            id=first_id + index,
+            config_set_id=config_set_id,
+            json_path=path,
+            label=label,
+            order_index=index,
+            export_mask_type=mask,
+        ))
+    return configs
+
+
+# ---------------------------------------------------------
+# In-memory database
+# ---------------------------------------------------------
+
+def make_session() -> Session:
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            JSONType.__table__,
+            JSONBatch.__table__,
+            JSONDocument.__table__,
+            ExportTemplate.__table__,
+            FieldConfigSet.__table__,
+            FieldConfig.__table__,
+        ],
+    )
+    return sessionmaker(bind=engine, autoflush=False)()
+
+
+def add_case(db: Session, rng: random.Random, case_id: int, size: str, docs: int) -> int:
+    """Create a json_type, templates, config set and batch for one size; returns batch id."""
+    questions, words = SIZES[size]
+    # SQLite does not autoincrement BIGINT keys, so ids are assigned here.
+    db.add(JSONType(id=case_id, code=f"bench_{size}", name=f"bench {size}"))
+    for offset, fmt in enumerate(ExportFormat):
+        db.add(ExportTemplate(
+            id=case_id * 10 + offset,
+            json_type_id=case_id,
+            name=f"Bench_{size}",
+            format=fmt,
+            with_answers=True,
+            template_path="bench",
+            version=1,
+        ))
+    db.add(FieldConfigSet(id=case_id, json_type_id=case_id, name=size, is_default=True, version=1))
+    db.add_all(make_field_configs(case_id, questions, first_id=case_id * 10_000))
+    db.add(JSONBatch(id=case_id, name=f"bench {size}", json_type_id=case_id))
+    db.add_all(
+        JSONDocument(
+            id=case_id * 1_000_000 + i,
+            batch_id=case_id,
+            json_type_id=case_id,
+            raw_json=make_document(rng, questions, words),
+        )
+        for i in range(docs)
+    )
+    db.commit()
+    return case_id
+
+
+# ---------------------------------------------------------
+# Measurement helpers
+# ---------------------------------------------------------
+
+def timed(fn: Callable[[], Any]) -> tuple:
+    t0 = time.perf_counter_ns()
+    result = fn()
+    return result, time.perf_counter_ns() - t0
+
+
+def peak_memory_kib(fn: Callable[[], Any]) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def drain(iterator) -> int:
+    count = 0
+    for _ in iterator:
+        count += 1
+    return count
+
+
+# ---------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------
+
+def bench_single(
+    db: Session,
+    documents: List[JSONDocument],
+    fmt: ExportFormat,
+    profile_path: Optional[str],
+) -> Dict[str, Any]:
+    stages: Dict[str, List[int]] = {
+        "lookup": [], "extract": [], "render": [], "base64": [], "serialise": [],
+    }
+    sizes = []
+    jobs = []
+
+    for doc in documents:
+        context, ns = timed(lambda: resolve_export_context(db, doc.json_type_id, fmt, True))
+        stages["lookup"].append(ns)
+        job, ns = timed(lambda: prepare_export(doc, fmt, True, context))
+        stages["extract"].append(ns)
+        data, ns = timed(lambda: render_job(job))
+        stages["render"].append(ns)
+        encoded, ns = timed(lambda: base64.b64encode(data).decode("utf-8"))
+        stages["base64"].append(ns)
+        _, ns = timed(lambda: json.dumps({"file_name": job.file_name, "file_data_base64": encoded}))
+        stages["serialise"].append(ns)
+        sizes.append(len(data))
+        jobs.append(job)
+
+    # End to end through the public entry point.
+    e2e = []
+    for doc in documents:
+        _, ns = timed(lambda: generate_export(db, doc, fmt, True))
+        e2e.append(ns)
+
+    total_ns = sum(sum(samples) for samples in stages.values())
+    result = {
+        "documents": len(documents),
+        "avg_file_kib": round(sum(sizes) / len(sizes) / 1024, 1),
+        "generate_export_docs_per_sec": round(len(e2e) / (sum(e2e) / 1e9), 1),
+        "generate_export": percentiles(e2e),
+        "stages": {
+            name: {
+                "share": round(sum(samples) / total_ns, 3),
+                **percentiles(samples),
+            }
+            for name, samples in stages.items()
+        },
+        "peak_kib": peak_memory_kib(lambda: [generate_export(db, d, fmt, True) for d in documents]),
+    }
+
+    if profile_path:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for job in jobs:
+            render_job(job)
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        result["profile"] = profile_path
+    return result
+
+
+def bench_batch(
+    db: Session,
+    batch_id: int,
+    fmt: ExportFormat,
+    docs: int,
+    workers: int,
+    warm: bool,
+) -> Dict[str, Any]:
+    def batch_files():
+        return drain(iter_batch_exports(db, batch_id, fmt, True, workers=workers))
+
+    def batch_response():
+        outputs = [
+            {
+                "document_id": item["document_id"],
+                "file_name": item["file_name"],
+                "file_data_base64": base64.b64encode(item["data"]).decode("utf-8"),
+            }
+            for item in iter_batch_exports(db, batch_id, fmt, True, workers=workers)
+        ]
+        return len(json.dumps(outputs))
+
+    def merged():
+        with tempfile.TemporaryFile() as out:
+            render_batch_merged(db, batch_id, fmt, True, out)
+            return out.tell()
+
+    result: Dict[str, Any] = {}
+    cases = [("iter_batch_exports", batch_files)]
+    if warm:
+        # Start cold; the second pass is served from the artifact cache.
+        get_artifact_cache().clear()
+        cases.append(("iter_batch_exports_warm", batch_files))
+    cases += [("batch_base64_response", batch_response), ("merged", merged)]
+
+    for name, fn in cases:
+        _, ns = timed(fn)
+        seconds = ns / 1e9
+        result[name] = {
+            "seconds": round(seconds, 3),
+            "docs_per_sec": round(docs / seconds, 1),
+        }
+    # Peak memory, measured separately since tracemalloc skews the timings.
+    result["iter_batch_exports"]["peak_kib"] = peak_memory_kib(batch_files)
+    result["batch_base64_response"]["peak_kib"] = peak_memory_kib(batch_response)
+    result["merged"]["peak_kib"] = peak_memory_kib(merged)
+    return result
+
+
+def top_functions(profile_path: str, limit: int) -> List[str]:
+    out = io.StringIO()
+    stats = pstats.Stats(profile_path, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue().splitlines()
+
+
+# ---------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------
+
+def print_report(report: Dict[str, Any]):
+    meta = report["meta"]
+    print(f"# export benchmark  {meta['timestamp']}")
+    print(
+        f"# python {meta['python']}  seed={meta['seed']}  docs={meta['docs']}  "
+        f"workers={meta['workers']}  artifact_cache={meta['artifact_cache']}"
+    )
+    print()
+    stage_names = ["lookup", "extract", "render", "base64", "serialise"]
+    print(
+        f"{'single document':<16} {'docs/s':>9} {'p50 us':>9} {'p99 us':>9} {'KiB':>7} "
+        + " ".join(f"{name[:9]:>9}" for name in stage_names)
+        + f" {'peak KiB':>10}"
+    )
+    for name, r in report["single"].items():
+        shares = " ".join(f"{r['stages'][s]['share'] * 100:>8.1f}%" for s in stage_names)
+        print(
+            f"{name:<16} {r['generate_export_docs_per_sec']:>9,.0f} "
+            f"{r['generate_export']['p50_us']:>9} {r['generate_export']['p99_us']:>9} "
+            f"{r['avg_file_kib']:>7} {shares} {r['peak_kib']:>10}"
+        )
+    print()
+    print(f"{'batch':<42} {'docs/s':>9} {'seconds':>9} {'peak KiB':>10}")
+    for case, paths in report["batch"].items():
+        for name, r in paths.items():
+            print(
+                f"{case + ' ' + name:<42} {r['docs_per_sec']:>9,.0f} {r['seconds']:>9} "
+                f"{r.get('peak_kib', ''):>10}"
+            )
+    for case, lines in report.get("profile_top", {}).items():
+        print()
+        print(f"# render profile {case}")
+        print("\n".join(lines))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=200, help="documents per size")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument(
+        "--formats", nargs="+", choices=[f.value for f in ExportFormat],
+        default=[f.value for f in ExportFormat],
+    )
+    parser.add_argument("--workers", type=int, default=1, help="render workers for batch paths")
+    parser.add_argument("--artifact-cache", action="store_true", help="enable the artifact cache")
+    parser.add_argument("--profile-dir", help="dump cProfile output of the render stage here")
+    parser.add_argument("--profile-top", type=int, default=0, help="print the top N profiled functions")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--json", dest="json_path", help="write machine-readable results here")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.docs = 20
+
+    settings.EXPORT_CACHE_ENABLED = args.artifact_cache
+    cache_dir = None
+    if args.artifact_cache:
+        cache_dir = tempfile.TemporaryDirectory(prefix="bench_export_cache_")
+        settings.EXPORT_CACHE_DIR = cache_dir.name
+
+    rng = random.Random(args.seed)
+    db = make_session()
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "docs": args.docs,
+            "sizes": args.sizes,
+            "workers": args.workers,
+            "artifact_cache": args.artifact_cache,
+        },
+        "single": {},
+        "batch": {},
+    }
+
+    try:
+        for case_id, size in enumerate(args.sizes, start=1):
+            batch_id = add_case(db, rng, case_id, size, args.docs)
+            documents = (
+                db.query(JSONDocument)
+                .filter(JSONDocument.batch_id == batch_id)
+                .order_by(JSONDocument.id)
+                .all()
+            )
+            for fmt_name in args.formats:
+                fmt = ExportFormat(fmt_name)
+                case = f"{fmt.value}/{size}"
+                profile_path = None
+                if args.profile_dir:
+                    os.makedirs(args.profile_dir, exist_ok=True)
+                    profile_path = os.path.join(
+                        args.profile_dir, f"render_{fmt.value}_{size}.prof"
+                    )
+
+                report["single"][case] = bench_single(db, documents, fmt, profile_path)
+                report["batch"][case] = bench_batch(
+                    db, batch_id, fmt, len(documents), args.workers, args.artifact_cache
+                )
+                if profile_path and args.profile_top:
+                    report.setdefault("profile_top", {})[case] = top_functions(
+                        profile_path, args.profile_top
+                    )
+    finally:
+        db.close()
+        if cache_dir is not None:
+            cache_dir.cleanup()
+
+    report["template_cache"] = get_template_cache().stats()
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+# benchmarks/bench_mapping_engine.py
+"""
+Benchmarks for app.utils.mapping_engine.
+
+Runs json_get / json_set / apply_transform micro-benchmarks and
+end-to-end apply_mapping_profile over synthetic documents (flat, deeply
+nested, wide arrays) and profiles of varying size and action mix. The
+profiles live in an in-memory SQLite database standing in for MySQL.
+
+    python -m benchmarks.bench_mapping_engine
+    python -m benchmarks.bench_mapping_engine --docs 5000 --json out.json
+    python -m benchmarks.bench_mapping_engine --quick
+
+With --json the results are written as machine-readable JSON so runs can
+be diffed or compared over time.
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.base import Base
+from app.models.json_type import JSONType
+from app.models.mapping import MappingProfile, MappingRule, MappingAction
+from app.utils import mapping_engine
+from app.utils.mapping_engine import (
+    apply_mapping_profile,
+    apply_transform,
+    compile_profile,
+    execute_plan,
+    json_get,
+    json_set,
+)
+
+
+# ---------------------------------------------------------
+# Synthetic documents
+# ---------------------------------------------------------
+
+def make_flat(rng: random.Random, fields: int = 40) -> dict:
+    return {f"field_{i}": _leaf(rng, i) for i in range(fields)}
+
+
+def make_nested(rng: random.Random, depth: int = 6, breadth: int = 3) -> dict:
+    def level(d: int) -> dict:
+        node = {f"v{i}": _leaf(rng, i) for i in range(breadth)}
+        if d < depth:
+            for i in range(breadth):
+                node[f"n{i}"] = level(d + 1)
+        return node
+    return level(1)
+
+
+def make_wide_arrays(rng: random.Random, items: int = 200) -> dict:
+    return {
+        "title": f"Paper {rng.randint(1, 10_000)}",
+        "items": [
+            {"id": i, "question": f"Question {i}?", "marks": rng.randint(1, 10),
+             "options": [f"opt {j}" for j in range(4)]}
+            for i in range(items)
+        ],
+    }
+
+
+def _leaf(rng: random.Random, i: int) -> Any:
+    kind = i % 4
+    if kind == 0:
+        return rng.randint(0, 1000)
+    if kind == 1:
+        return f"  Value {rng.randint(0, 1000)}  "
+    if kind == 2:
+        return rng.random() * 100
+    return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024"
+
+
+DOCUMENT_KINDS: Dict[str, Callable[[random.Random], dict]] = {
+    "flat": make_flat,
+    "nested": make_nested,
+    "wide_arrays": make_wide_arrays,
+}
+
+
+def source_paths(kind: str) -> List[str]:
+    """Plain paths that exist in documents of this kind."""
+    if kind == "flat":
+        return [f"$.field_{i}" for i in range(40)]
+    if kind == "nested":
+        paths = []
+        prefix = "$"
+        for _ in range(6):
+            paths.extend(f"{prefix}.v{i}" for i in range(3))
+            prefix += ".n1"
+        return paths
+    return ["$.title"] + [f"$.items[{i}].{f}" for i in range(0, 200, 10) for f in ("question", "marks")]
+
+
+def query_paths(kind: str) -> List[str]:
+    """Wildcard paths that go through jsonpath_ng."""
+    if kind == "flat":
+        return ["$.*"]
+    if kind == "nested":
+        return ["$.n0.*", "$..v0"]
+    return ["$.items[*].marks", "$.items[*].options[0]"]
+
+
+# ---------------------------------------------------------
+# Synthetic profiles
+# ---------------------------------------------------------
+
+TRANSFORMS = [
+    "value.strip().upper() if value is not None else value",
+    "value * 2 if value is not None else 0",
+    "concat(value, ' marks')",
+]
+
+ACTION_MIXES = {
+    "map_only": {MappingAction.MAP: 1.0},
+    "mixed": {
+        MappingAction.MAP: 0.6,
+        MappingAction.DEFAULT: 0.2,
+        MappingAction.ADD: 0.1,
+        MappingAction.IGNORE: 0.1,
+    },
+    "transform_heavy": {MappingAction.MAP: 1.0},
+    "wildcards": {MappingAction.MAP: 1.0},
+}
+
+
+def build_rules(
+    rng: random.Random,
+    profile_id: int,
+    kind: str,
+    rule_count: int,
+    mix: str,
+    first_rule_id: int,
+) -> List[MappingRule]:
+    actions, weights = zip(*ACTION_MIXES[mix].items())
+    paths = query_paths(kind) if mix == "wildcards" else source_paths(kind)
+
+    rules = []
+    for i in range(rule_count):
+        action = rng.choices(actions, weights)[0]
+        transform = None
+        if mix == "transform_heavy" or (mix == "mixed" and i % 3 == 0):
+            transform = TRANSFORMS[i % len(TRANSFORMS)]
+        rules.append(MappingRule(
+            id=first_rule_id + i,
+            profile_id=profile_id,
+            action=action,
+            source_json_path=None if action == MappingAction.ADD else paths[i % len(paths)],
+            target_json_path=f"$.out.group_{i % 5}.field_{i}",
+            default_value="n/a",
+            transform_expr=transform,
+            order_index=i,
+        ))
+    return rules
+
+
+# ---------------------------------------------------------
+# In-memory database
+# ---------------------------------------------------------
+
+def make_session() -> Session:
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(
+        engine,
+        tables=[JSONType.__table__, MappingProfile.__table__, MappingRule.__table__],
+    )
+    return sessionmaker(bind=engine, autoflush=False)()
+
+
+def add_profile(db: Session, profile_id: int, rules: List[MappingRule]):
+    # SQLite does not autoincrement BIGINT keys, so ids are assigned here.
+    db.add(MappingProfile(
+        id=profile_id,
+        name=f"bench_{profile_id}",
+        source_type_id=1,
+        target_type_id=1,
+        version=1,
+    ))
+    db.add_all(rules)
+    db.commit()
+
+
+# ---------------------------------------------------------
+# Measurement helpers
+# ---------------------------------------------------------
+
+def percentiles(samples_ns: List[int]) -> Dict[str, float]:
+    if not samples_ns:
+        return {}
+    ordered = sorted(samples_ns)
+
+    def pct(p: float) -> float:
+        idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return round(ordered[idx] / 1000, 3)
+
+    return {
+        "p50_us": pct(50),
+        "p90_us": pct(90),
+        "p99_us": pct(99),
+        "max_us": round(ordered[-1] / 1000, 3),
+        "mean_us": round(statistics.fmean(ordered) / 1000, 3),
+    }
+
+
+def timed_ops(fn: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t0)
+    total_s = sum(samples) / 1e9
+    result = {"iterations": iterations, "ops_per_sec": round(iterations / total_s, 1)}
+    result.update(percentiles(samples))
+    return result
+
+
+def measure_allocations(fn: Callable[[], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    allocated = sum(s.size_diff for s in stats if s.size_diff > 0)
+    blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+    return {
+        "peak_kib": round(peak / 1024, 1),
+        "retained_kib": round(allocated / 1024, 1),
+        "retained_blocks": blocks,
+    }
+
+
+# ---------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------
+
+def bench_micro(rng: random.Random, iterations: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for kind, make in DOCUMENT_KINDS.items():
+        doc = make(rng)
+        simple = source_paths(kind)[-1]
+        query = query_paths(kind)[0]
+
+        results[f"json_get/{kind}/simple"] = timed_ops(lambda: json_get(doc, simple), iterations)
+        results[f"json_get/{kind}/query"] = timed_ops(lambda: json_get(doc, query), iterations)
+        results[f"json_set/{kind}/deep_create"] = timed_ops(
+            lambda: json_set({}, "$.a.b.c.d", 1), iterations
+        )
+        results[f"json_set/{kind}/overwrite"] = timed_ops(
+            lambda: json_set(doc, simple, 1), iterations
+        )
+
+    for expr in TRANSFORMS:
+        results[f"apply_transform/{expr}"] = timed_ops(
+            lambda: apply_transform("  Value 10 ", expr)
+            if "strip" in expr or "concat" in expr
+            else apply_transform(10, expr),
+            iterations,
+        )
+    return results
+
+
+def bench_profiles(
+    rng: random.Random,
+    docs_per_case: int,
+    rule_counts: List[int],
+    per_rule_docs: int,
+) -> Dict[str, Any]:
+    db = make_session()
+    results: Dict[str, Any] = {}
+    profile_id = 0
+    next_rule_id = 1
+
+    for kind, make in DOCUMENT_KINDS.items():
+        documents = [make(rng) for _ in range(docs_per_case)]
+
+        for mix in ACTION_MIXES:
+            for rule_count in rule_counts:
+                profile_id += 1
+                rules = build_rules(rng, profile_id, kind, rule_count, mix, next_rule_id)
+                next_rule_id += rule_count
+                add_profile(db, profile_id, rules)
+                case = f"{kind}/{mix}/{rule_count}_rules"
+
+                # Cold: first call compiles and caches the plan.
+                t0 = time.perf_counter()
+                apply_mapping_profile(profile_id, documents[0], db)
+                cold_ms = (time.perf_counter() - t0) * 1000
+
+                # End to end, including the per-call profile version lookup.
+                t0 = time.perf_counter()
+                for doc in documents:
+                    apply_mapping_profile(profile_id, doc, db)
+                e2e = time.perf_counter() - t0
+
+                # Plan execution only, as convert-batch does it.
+                plan = mapping_engine.get_compiled_profile(profile_id, db)
+                doc_samples = []
+                for doc in documents:
+                    s0 = time.perf_counter_ns()
+                    execute_plan(plan, doc, [])
+                    doc_samples.append(time.perf_counter_ns() - s0)
+                exec_s = sum(doc_samples) / 1e9
+
+                # Per-rule latency: each rule run as a one-rule plan.
+                profile = db.query(MappingProfile).get(profile_id)
+                rule_samples: List[int] = []
+                for rule in rules:
+                    single = compile_profile(profile, [rule])
+                    if not single.rules:
+                        continue
+                    for doc in documents[:per_rule_docs]:
+                        s0 = time.perf_counter_ns()
+                        execute_plan(single, doc, [])
+                        rule_samples.append(time.perf_counter_ns() - s0)
+
+                allocations = measure_allocations(
+                    lambda: [execute_plan(plan, doc, []) for doc in documents]
+                )
+
+                results[case] = {
+                    "documents": len(documents),
+                    "rules": rule_count,
+                    "compiled_rules": len(plan.rules),
+                    "cold_first_call_ms": round(cold_ms, 3),
+                    "apply_mapping_profile_docs_per_sec": round(len(documents) / e2e, 1),
+                    "execute_plan_docs_per_sec": round(len(documents) / exec_s, 1),
+                    "per_document": percentiles(doc_samples),
+                    "per_rule": percentiles(rule_samples),
+                    "allocations": allocations,
+                }
+    db.close()
+    return results
+
+
+# ---------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------
+
+def print_report(report: Dict[str, Any]):
+    print(f"# mapping_engine benchmark  {report['meta']['timestamp']}")
+    print(f"# python {report['meta']['python']}  seed={report['meta']['seed']}")
+    print()
+    print(f"{'micro benchmark':<70} {'ops/s':>12} {'p50 us':>9} {'p99 us':>9}")
+    for name, r in report["micro"].items():
+        print(f"{name[:70]:<70} {r['ops_per_sec']:>12,.0f} {r['p50_us']:>9} {r['p99_us']:>9}")
+    print()
+    print(
+        f"{'profile case':<38} {'docs/s e2e':>11} {'docs/s plan':>12} "
+        f"{'rule p50':>9} {'rule p99':>9} {'peak KiB':>9}"
+    )
+    for name, r in report["profiles"].items():
+        print(
+            f"{name:<38} {r['apply_mapping_profile_docs_per_sec']:>11,.0f} "
+            f"{r['execute_plan_docs_per_sec']:>12,.0f} "
+            f"{r['per_rule'].get('p50_us', 0):>9} {r['per_rule'].get('p99_us', 0):>9} "
+            f"{r['allocations']['peak_kib']:>9}"
+        )
+    print()
+    print(f"path cache: {report['path_cache']}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=1000, help="documents per profile case")
+    parser.add_argument("--rules", type=int, nargs="+", default=[5, 20, 40])
+    parser.add_argument("--iterations", type=int, default=20000, help="micro-benchmark iterations")
+    parser.add_argument("--per-rule-docs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--json", dest="json_path", help="write machine-readable results here")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.docs, args.rules, args.iterations, args.per_rule_docs = 50, [5, 20], 500, 20
+
+    rng = random.Random(args.seed)
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "docs": args.docs,
+            "rules": args.rules,
+            "iterations": args.iterations,
+        },
+        "micro": bench_micro(rng, args.iterations),
+        "profiles": bench_profiles(rng, args.docs, args.rules, args.per_rule_docs),
+        "path_cache": mapping_engine.path_cache_stats(),
+    }
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+-- user-002: compiled mapping plans are cached per profile version
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+ALTER TABLE mapping_profile
+    ADD COLUMN version INT NOT NULL DEFAULT 1;
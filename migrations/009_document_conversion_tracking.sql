@@ -0,0 +1,11 @@
+-- user-009: skip reconverting documents whose raw_json and profile
+-- have not changed since normalized_json was produced
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+ALTER TABLE json_document
+    ADD COLUMN content_hash VARCHAR(64) NULL,
+    ADD COLUMN converted_profile_id BIGINT NULL,
+    ADD COLUMN converted_profile_version INT NULL,
+    ADD CONSTRAINT fk_json_document_converted_profile
+        FOREIGN KEY (converted_profile_id) REFERENCES mapping_profile (id);
@@ -0,0 +1,18 @@
+-- user-012: per-field export configuration
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+CREATE TABLE IF NOT EXISTS field_config (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    config_set_id BIGINT NOT NULL,
+    json_path VARCHAR(500) NOT NULL,
+    label VARCHAR(255) NULL,
+    order_index INT NOT NULL DEFAULT 0,
+    show_in_ui BOOL NOT NULL DEFAULT 1,
+    show_in_export BOOL NOT NULL DEFAULT 1,
+    required BOOL NOT NULL DEFAULT 0,
+    export_mask_type ENUM('NONE', 'HIDE_VALUE', 'REDACT') NOT NULL DEFAULT 'NONE',
+    PRIMARY KEY (id),
+    CONSTRAINT fk_field_config_config_set
+        FOREIGN KEY (config_set_id) REFERENCES field_config_set (id)
+);
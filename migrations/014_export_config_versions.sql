@@ -0,0 +1,9 @@
+-- user-014: export cache keys include template and field config versions
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+ALTER TABLE export_template
+    ADD COLUMN version INT NOT NULL DEFAULT 1;
+
+ALTER TABLE field_config_set
+    ADD COLUMN version INT NOT NULL DEFAULT 1;
@@ -0,0 +1,27 @@
+-- user-016: background batch export jobs
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+CREATE TABLE export_job (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    batch_id BIGINT NOT NULL,
+    format ENUM('DOCX', 'PDF') NOT NULL,
+    with_answers BOOL NOT NULL DEFAULT 1,
+    template_id BIGINT NULL,
+    status ENUM('PENDING', 'RUNNING', 'DONE', 'FAILED') NOT NULL DEFAULT 'PENDING',
+    total_documents INT NOT NULL DEFAULT 0,
+    done_documents INT NOT NULL DEFAULT 0,
+    failed_documents INT NOT NULL DEFAULT 0,
+    result_path VARCHAR(500) NULL,
+    error TEXT NULL,
+    worker VARCHAR(100) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    heartbeat_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT fk_export_job_batch
+        FOREIGN KEY (batch_id) REFERENCES json_batch (id),
+    CONSTRAINT fk_export_job_template
+        FOREIGN KEY (template_id) REFERENCES export_template (id)
+);
@@ -0,0 +1,10 @@
+-- user-024: duplicate detection at upload
+-- (needs content_hash from user-009)
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+ALTER TABLE json_document
+    ADD COLUMN duplicate_of_id BIGINT NULL,
+    ADD CONSTRAINT fk_json_document_duplicate_of
+        FOREIGN KEY (duplicate_of_id) REFERENCES json_document (id) ON DELETE SET NULL,
+    ADD INDEX ix_json_document_type_hash (json_type_id, content_hash);
@@ -0,0 +1,24 @@
+-- user-025: compressed document storage
+--
+-- raw_json must allow NULL before DOCUMENT_COMPRESSION is switched on:
+-- compressed rows keep the body in raw_json_packed and leave raw_json
+-- empty.
+--
+-- MySQL 8. Run once, before starting the code that needs it.
+
+ALTER TABLE json_document
+    MODIFY COLUMN raw_json JSON NULL,
+    ADD COLUMN raw_json_packed LONGBLOB NULL,
+    ADD COLUMN normalized_json_packed LONGBLOB NULL;
+
+CREATE TABLE compression_dictionary (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    json_type_id BIGINT NOT NULL,
+    codec VARCHAR(20) NOT NULL,
+    data MEDIUMBLOB NOT NULL,
+    sample_count INT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    CONSTRAINT fk_compression_dictionary_json_type
+        FOREIGN KEY (json_type_id) REFERENCES json_type (id)
+);
@@ -0,0 +1,189 @@
+import json
+
+import pytest
+
+from app.utils.json_stream import ARRAY, NDJSON, JSONStreamError, JSONStreamParser
+
+
+DOCS = [
+    {"q": "plain"},
+    {"q": 'quote " and backslash \\ and \\" escaped', "n": -12.5e3},
+    {"q": "unicode é 物理 🙂", "list": [1, [2, {"deep": None}]]},
+    123456789,
+    "a string document",
+    [],
+    {},
+    True,
+]
+
+
+def parse(chunks, fmt, **kwargs):
+    parser = JSONStreamParser(fmt, **kwargs)
+    documents = []
+    for chunk in chunks:
+        documents.extend(parser.feed(chunk))
+    documents.extend(parser.close())
+    return documents
+
+
+def split_every(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def ndjson_bytes(docs):
+    return "\n".join(json.dumps(d, ensure_ascii=False) for d in docs).encode("utf-8")
+
+
+def array_bytes(docs):
+    return json.dumps(docs, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+# ---------------------------------------------------------
+# Chunk boundaries
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("fmt, encode", [(NDJSON, ndjson_bytes), (ARRAY, array_bytes)])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_any_chunking_gives_the_same_documents(fmt, encode, size):
+    # Size 1 splits inside strings, escapes, numbers and multi-byte UTF-8.
+    assert parse(split_every(encode(DOCS), size), fmt) == DOCS
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b"[12", b"34, 5", b"6]"], [1234, 56]),
+    ([b"[1.", b"5]"], [1.5]),
+    ([b"[1e", b"3]"], [1000.0]),
+    ([b"[1E+", b"2, -", b"0.25]"], [100.0, -0.25]),
+    ([b"[2.5e-", b"1]"], [0.25]),
+    ([b"[1", b".", b"2", b"5", b"]"], [1.25]),
+])
+def test_number_split_at_the_end_of_a_chunk_is_not_cut_short(chunks, expected):
+    assert parse(chunks, ARRAY) == expected
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b"[tr", b"ue, nu", b"ll]"], [True, None]),
+    ([b'["\\u00', b'e9"]'], ["\u00e9"]),
+    ([b'["\\ud83d', b'\\ude00"]'], ["\U0001f600"]),
+    ([b'["\\ud83d\\u', b'de00"]'], ["\U0001f600"]),
+])
+def test_literals_and_escapes_split_across_chunks(chunks, expected):
+    assert parse(chunks, ARRAY) == expected
+
+
+def test_escape_split_across_chunks():
+    assert parse([b'["a\\', b'"b"]'], ARRAY) == ['a"b']
+
+
+def test_documents_are_returned_as_soon_as_complete():
+    parser = JSONStreamParser(ARRAY)
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b": 2}]") == [{"b": 2}]
+    assert parser.close() == []
+    assert parser.count == 2
+
+
+# ---------------------------------------------------------
+# NDJSON specifics
+# ---------------------------------------------------------
+
+def test_ndjson_ignores_blank_lines_and_crlf():
+    data = b'{"a": 1}\r\n\r\n  \n{"b": 2}\r\n'
+    assert parse([data], NDJSON) == [{"a": 1}, {"b": 2}]
+
+
+def test_ndjson_last_line_without_newline():
+    assert parse([b'{"a": 1}\n{"b": 2}'], NDJSON) == [{"a": 1}, {"b": 2}]
+
+
+def test_ndjson_is_not_an_array():
+    # A top-level array on one NDJSON line is a single document.
+    assert parse([b"[1, 2]\n"], NDJSON) == [[1, 2]]
+
+
+def test_array_is_not_ndjson():
+    with pytest.raises(JSONStreamError, match="Expected a JSON array"):
+        parse([b'{"a": 1}\n{"b": 2}\n'], ARRAY)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        JSONStreamParser("csv")
+
+
+# ---------------------------------------------------------
+# Malformed input
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("data, message", [
+    (b'{"a": 1}\n{"b": }\n', "Line 2"),
+    (b'{"a": 1}\n{"b": 2', "Line 2"),
+    (b"not json\n", "Line 1"),
+])
+def test_malformed_ndjson(data, message):
+    with pytest.raises(JSONStreamError, match=message):
+        parse(split_every(data, 3), NDJSON)
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"", "Expected a JSON array"),
+    (b"   ", "Expected a JSON array"),
+    (b"[1, 2", "Unexpected end of input after 2 documents"),
+    (b"[1, 2,", "Unexpected end of input"),
+    (b"[1 2]", "Expected ',' or ']' after document 1"),
+    (b"[1, }]", "Document 2"),
+    (b'[{"a": 1}] [2]', "Unexpected data after the closing"),
+    (b'[{"a": }]', "Document 1"),
+])
+def test_malformed_array(data, message):
+    with pytest.raises(JSONStreamError, match=message):
+        parse(split_every(data, 2), ARRAY)
+
+
+def test_syntax_error_mid_stream_is_reported_before_more_input():
+    parser = JSONStreamParser(ARRAY, max_document_bytes=1000)
+    parser.feed(b'[{"a": 1}, ')
+    with pytest.raises(JSONStreamError, match="Document 2: Expecting value"):
+        parser.feed(b'{"b": }')
+
+
+@pytest.mark.parametrize("tail", [b'x"} 1 ', b'x", "b": } '])
+def test_syntax_error_in_a_large_document_is_not_reported_as_too_large(tail):
+    # The first chunk leaves the document cut off, so parsing waits for
+    # more input; the error must still surface as a syntax error.
+    parser = JSONStreamParser(ARRAY, max_document_bytes=1000)
+    parser.feed(b'[{"a": "' + b"x" * 300)
+    with pytest.raises(JSONStreamError) as info:
+        for _ in range(100):
+            parser.feed(tail + b" " * 20)
+    assert "exceeds" not in str(info.value)
+
+
+def test_large_documents_under_the_limit_are_not_held_back():
+    docs = [{"a": "x" * 600}, {"b": "y" * 600}, {"c": 1}]
+    data = array_bytes(docs)
+    assert parse(split_every(data, 50), ARRAY, max_document_bytes=1000) == docs
+
+
+def test_invalid_utf8_is_rejected():
+    with pytest.raises(JSONStreamError, match="Invalid UTF-8"):
+        parse([b'["\xff"]'], ARRAY)
+
+
+def test_truncated_utf8_at_end_is_rejected():
+    with pytest.raises(JSONStreamError, match="Invalid UTF-8"):
+        parse([b'["\xe7\x89'], ARRAY)
+
+
+@pytest.mark.parametrize("fmt, data", [
+    (NDJSON, b'{"a": "' + b"x" * 200),
+    (ARRAY, b'[{"a": "' + b"x" * 200),
+])
+def test_oversized_document_is_rejected(fmt, data):
+    with pytest.raises(JSONStreamError, match="exceeds 100 bytes"):
+        parse(split_every(data, 16), fmt, max_document_bytes=100)
+
+
+def test_documents_under_the_limit_are_accepted():
+    docs = [{"a": "x" * 50}] * 20
+    assert parse(split_every(ndjson_bytes(docs), 16), NDJSON, max_document_bytes=100) == docs
@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.mapping import MappingAction
+from app.utils.mapping_engine import (
+    MISSING,
+    PathExtractor,
+    QueryPath,
+    SimplePath,
+    compile_path,
+    compile_profile,
+    execute_plan,
+    json_get,
+    json_set,
+)
+
+
+DOC = {
+    "a": {"b": {"c": 1}},
+    "items": [{"x": 1}, {"x": 2}, {"x": 3}],
+    "odd key": {"v": "spaced"},
+    "empty": None,
+}
+
+
+def make_plan(*rules):
+    profile = SimpleNamespace(id=1, version=1)
+    return compile_profile(profile, [
+        SimpleNamespace(
+            id=i,
+            action=action,
+            source_json_path=source,
+            target_json_path=target,
+            default_value=default,
+            transform_expr=transform,
+        )
+        for i, (action, source, target, default, transform) in enumerate(rules, start=1)
+    ])
+
+
+# ---------------------------------------------------------
+# Path compilation
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("path", ["$.a.b.c", "a.b.c", "$.items[1].x", "$['odd key'].v", "$"])
+def test_plain_paths_compile_to_simple_paths(path):
+    assert isinstance(compile_path(path), SimplePath)
+
+
+@pytest.mark.parametrize("path", ["$.items[*].x", "$..x", "$.items[0:2]"])
+def test_query_paths_fall_back_to_jsonpath(path):
+    assert isinstance(compile_path(path), QueryPath)
+
+
+# ---------------------------------------------------------
+# Reading
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("path, expected", [
+    ("$.a.b.c", 1),
+    ("a.b.c", 1),
+    ("$.items[1].x", 2),
+    ("$.items[-1].x", 3),
+    ("$['odd key'].v", "spaced"),
+    ("$.items[*].x", [1, 2, 3]),
+    ("$.missing.deeper", None),
+    ("$.items[7].x", None),
+    ("$.a.b.c.d", None),
+    ("$.empty", None),
+])
+def test_json_get(path, expected):
+    assert json_get(DOC, path) == expected
+
+
+def test_extractor_matches_json_get():
+    paths = ["$.a.b.c", "$.a.b", "$.items[0].x", "$.items[*].x", "$.missing", "$['odd key'].v"]
+    row = PathExtractor(paths).extract(DOC)
+    assert [None if v is MISSING else v for v in row] == [json_get(DOC, p) for p in paths]
+
+
+# ---------------------------------------------------------
+# Writing
+# ---------------------------------------------------------
+
+def test_set_creates_intermediate_objects_and_arrays():
+    target = {}
+    json_set(target, "$.out.list[2].name", "n")
+    assert target == {"out": {"list": [None, None, {"name": "n"}]}}
+
+
+def test_set_overwrites_existing_values():
+    target = {"out": {"x": 1}}
+    json_set(target, "$.out.x", 2)
+    assert target == {"out": {"x": 2}}
+
+
+def test_set_through_a_scalar_is_a_type_error():
+    with pytest.raises(TypeError, match="not an object or array"):
+        json_set({"out": {"x": 1}}, "$.out.x.y", 2)
+
+
+def test_set_root_is_rejected():
+    with pytest.raises(ValueError):
+        json_set({}, "$", 1)
+
+
+# ---------------------------------------------------------
+# Executing plans
+# ---------------------------------------------------------
+
+def test_execute_plan_maps_defaults_and_adds():
+    plan = make_plan(
+        (MappingAction.MAP, "$.a.b.c", "$.out.c", None, None),
+        (MappingAction.DEFAULT, "$.missing", "$.out.d", "dflt", None),
+        (MappingAction.ADD, None, "$.out.e", "added", "upper(value)"),
+        (MappingAction.MAP, "$.missing", "$.out.skipped", None, None),
+        (MappingAction.IGNORE, "$.a", "$.out.ignored", None, None),
+    )
+    errors = []
+    assert execute_plan(plan, DOC, errors) == {"out": {"c": 1, "d": "dflt", "e": "ADDED"}}
+    assert errors == []
+
+
+def test_conflicting_targets_are_reported_per_rule():
+    plan = make_plan(
+        (MappingAction.MAP, "$.a.b.c", "$.out.x", None, None),
+        (MappingAction.MAP, "$.a.b.c", "$.out.x.y", None, None),
+        (MappingAction.ADD, None, "$", "whole", None),
+        (MappingAction.ADD, None, "$.out.z", "ok", None),
+    )
+    errors = []
+    result = execute_plan(plan, DOC, errors)
+
+    assert result == {"out": {"x": 1, "z": "ok"}}
+    assert [e["rule_id"] for e in errors] == [2, 3]
+    assert errors[0]["target_json_path"] == "$.out.x.y"
+    assert "not an object or array" in errors[0]["error"]
+
+
+def test_failed_transforms_are_reported_and_skipped():
+    plan = make_plan(
+        (MappingAction.MAP, "$.a.b.c", "$.out.x", None, "value / 0"),
+        (MappingAction.MAP, "$.a.b.c", "$.out.y", None, "bogus(value)"),
+    )
+    errors = []
+    assert execute_plan(plan, DOC, errors) == {}
+    assert [e["rule_id"] for e in errors] == [1, 2]
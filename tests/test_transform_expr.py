@@ -0,0 +1,142 @@
+import pytest
+
+from app.utils.transform_expr import MAX_RESULT_LENGTH, TransformError, compile_expression
+
+
+def run(source, value=None):
+    return compile_expression(source)(value)
+
+
+# ---------------------------------------------------------
+# Accepted expressions
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("source, value, expected", [
+    ("upper(value)", "ab", "AB"),
+    ("value.strip().lower()", "  Ab ", "ab"),
+    ("value * 100 if value is not None else 0", 2, 200),
+    ("value * 100 if value is not None else 0", None, 0),
+    ('concat(value, " marks")', 5, "5 marks"),
+    ('date(value, "%d/%m/%Y", "%Y-%m-%d")', "03/02/2024", "2024-02-03"),
+    ('lookup(value, {"A": 1, "B": 2}, 0)', "B", 2),
+    ("value.zfill(4)", "7", "0007"),
+    ("value % 7", 23, 2),
+    ('value.replace("a", "bb")', "aXa", "bbXbb"),
+    ('"-".join(value)', ["a", "b"], "a-b"),
+    ("value[1:3]", "abcd", "bc"),
+])
+def test_accepted_expressions(source, value, expected):
+    assert run(source, value) == expected
+
+
+# ---------------------------------------------------------
+# Forbidden syntax, names and attributes
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("source", [
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "lambda: 1",
+    "[x for x in value]",
+    "value.__class__",
+    "value.__class__.__mro__",
+    "().__class__.__bases__[0].__subclasses__()",
+    "value ** 2",
+    "value << 2",
+    "other",
+    "upper(value, x=1)",
+    "value[::2]",
+    "{**value}",
+    "value.format(1)",
+    "value.encode()",
+    "(lambda: 1)()",
+    "value = 1",
+    "value.keys()",
+    "value.values()",
+])
+def test_forbidden_syntax_is_rejected(source):
+    with pytest.raises(TransformError):
+        compile_expression(source)
+
+
+def test_method_must_exist_on_the_runtime_type():
+    # "get" is whitelisted for dicts only
+    fn = compile_expression('value.get("a")')
+    assert fn({"a": 1}) == 1
+    with pytest.raises(TransformError, match="not available on str"):
+        fn("abc")
+
+
+def test_overlong_expression_is_rejected():
+    with pytest.raises(TransformError, match="too long"):
+        compile_expression("value + " * 500 + "1")
+
+
+def test_evaluation_errors_are_transform_errors():
+    with pytest.raises(TransformError, match="ZeroDivisionError"):
+        run("value / 0", 1)
+
+
+# ---------------------------------------------------------
+# Result size limits (checked before the work is done)
+# ---------------------------------------------------------
+
+@pytest.mark.parametrize("source, value", [
+    ("value.zfill(2000000000)", "1"),
+    ('"x" * 2000000000', None),
+    ("value * 2000000000", ["a"]),
+    ('"%02000000000d" % value', 1),
+    ('"%s" % value', "a"),
+    ('value.replace("", "xxxxxxxxxx")', "a" * 20000),
+    ('value.replace("a", value)', "a" * 1000),
+    ("value.join(value)", "a" * 1000),
+    ('join(value, ["a"] * 1000)', "b" * 1000),
+    ('replace(value, "a", "bbbbbbbbbb")', "a" * 20000),
+    # nested repetition: few references, but huge once stringified
+    ("str([[1] * 100000] * 100000)", None),
+    ("[[1] * 1000] * 1000", None),
+    ("[value] * 1000", "x" * 1000),
+    ("concat([value] * 100000)", "x" * 100000),
+    ("[value, value]", "x" * 60000),
+    ("[value] + [value]", "x" * 60000),
+    # coercing containers to text
+    ("str(value)", [["x" * 1000] * 100] * 100),
+    ("concat(value, value)", ["x" * 60000]),
+    ('join("", value)', [["x" * 1000] * 100] * 100),
+    ('join(", ", value)', ["x"] * 60000),
+    ("upper(value)", {"k": ["x" * 60000] * 2}),
+    ("substr(value, 0, 5)", [list(range(20000))] * 10),
+])
+def test_oversized_results_are_refused(source, value):
+    with pytest.raises(TransformError, match="too large|not allowed"):
+        run(source, value)
+
+
+def test_results_at_the_limit_are_allowed():
+    assert len(run(f"value.zfill({MAX_RESULT_LENGTH})", "1")) == MAX_RESULT_LENGTH
+    assert len(run(f'"x" * {MAX_RESULT_LENGTH}')) == MAX_RESULT_LENGTH
+
+
+def test_result_size_is_checked_after_calls():
+    with pytest.raises(TransformError, match="too large"):
+        run("concat(value, value)", "a" * MAX_RESULT_LENGTH)
+
+
+@pytest.mark.parametrize("source, value", [
+    ("str(value)", [1, "a", None, True, 1.5, {"k": [2]}]),
+    ("str(value)", {"a": [1, 2], "b": {"c": "d"}}),
+    ("concat(value, 1)", [1, 2]),
+    ('join("-", value)', [1, None, "x", [2]]),
+])
+def test_containers_stringify_like_str(source, value):
+    expected = {
+        "str(value)": lambda v: str(v),
+        "concat(value, 1)": lambda v: str(v) + "1",
+        'join("-", value)': lambda v: "-".join("" if i is None else str(i) for i in v),
+    }[source](value)
+    assert run(source, value) == expected
+
+
+def test_repetition_within_the_limit_is_allowed():
+    assert run("[[1] * 100] * 100") == [[1] * 100] * 100
+    assert run("concat([value] * 10)", "ab") == str(["ab"] * 10)